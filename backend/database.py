@@ -1,6 +1,10 @@
 """Gestion de la base de données et schémas"""
+import hashlib
+import io
+from contextlib import contextmanager
+import pandas as pd
 from fastapi import HTTPException
-import psycopg
+from psycopg_pool import ConnectionPool, PoolTimeout
 from config import DATABASE_URL
 
 POINTAGE_SCHEMA = """
@@ -78,41 +82,162 @@ CREATE TABLE IF NOT EXISTS llti_record (
 );
 """
 
+# Compteur d'écritures par table, incrémenté par copy_upsert dans la transaction d'écriture :
+# sa valeur validée change à chaque commit, quel que soit l'ordre des transactions concurrentes
+TABLE_GENERATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS table_generation (
+    table_name text PRIMARY KEY,
+    generation bigint NOT NULL DEFAULT 0
+);
+"""
+
+
+# Migrations idempotentes appliquées après la création des tables
+SCHEMA_MIGRATIONS = """
+ALTER TABLE meeting_summary ADD COLUMN IF NOT EXISTS markdown_content text;
+ALTER TABLE meeting_summary DROP COLUMN IF EXISTS pdf_path;
+"""
+
+# DDL complet envoyé en un seul aller-retour
+SCHEMA_DDL = "\n".join([
+    POINTAGE_SCHEMA,
+    LEAN_ACTION_SCHEMA,
+    MEETING_SUMMARY_SCHEMA,
+    INSPECTION_RECORD_SCHEMA,
+    LLTI_RECORD_SCHEMA,
+    TABLE_GENERATION_SCHEMA,
+    SCHEMA_MIGRATIONS,
+])
 
+# Empreinte du DDL, enregistrée en commentaire de la table pointage une fois appliqué :
+# un démarrage sur une base déjà à jour se limite à une lecture de catalogue
+SCHEMA_VERSION = "schema:" + hashlib.sha256(SCHEMA_DDL.encode()).hexdigest()[:16]
+_schema_ready = False
+
+
+# Pool de connexions partagé (évite un handshake TCP/auth Postgres à chaque requête)
+POOL = ConnectionPool(
+    DATABASE_URL,
+    min_size=4,
+    max_size=20,
+    kwargs={"autocommit": False},
+    open=True,
+    timeout=10,
+)
+
+
+@contextmanager
 def get_conn():
-    """Retourne une connexion à la base de données"""
+    """Emprunte une connexion au pool (rendue automatiquement en sortie de bloc)"""
     try:
-        return psycopg.connect(DATABASE_URL)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"DB connection failed: {exc}") from exc
+        with POOL.connection() as conn:
+            yield conn
+    except PoolTimeout as exc:
+        raise HTTPException(status_code=503, detail=f"DB pool indisponible: {exc}") from exc
+
+
+def read_sql_copy(query: str, params: list | None = None, text_columns: list[str] | None = None) -> pd.DataFrame:
+    """Charge le résultat d'un SELECT via COPY ... TO STDOUT (CSV en mémoire)
+    
+    Plus rapide que pd.read_sql_query sur les gros volumes : pas de conversion
+    ligne par ligne en objets Python, le CSV est parsé directement par pandas.
+    
+    Args:
+        query: Requête SELECT (placeholders %s autorisés)
+        params: Paramètres de la requête (optionnel)
+        text_columns: Colonnes à conserver en texte (None pour les NULL)
+        
+    Returns:
+        DataFrame du résultat (les dates restent des chaînes ISO)
+    """
+    text_columns = text_columns or []
+    buf = io.BytesIO()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY ({query}) TO STDOUT WITH (FORMAT CSV, HEADER, NULL '\\N')", params) as copy:
+                for block in copy:
+                    buf.write(block)
+    buf.seek(0)
+
+    df = pd.read_csv(
+        buf,
+        dtype={col: str for col in text_columns},
+        keep_default_na=False,
+        na_values=["\\N"],
+    )
+    if text_columns:
+        df[text_columns] = df[text_columns].astype(object).where(df[text_columns].notna(), None)
+    return df
+
+
+def copy_upsert(cur, table: str, columns: list[str], conflict: list[str], rows: list[tuple]) -> None:
+    """Insère / met à jour des lignes en masse via COPY puis une seule fusion
+    
+    Remplace executemany (un aller-retour serveur par ligne) : les lignes sont
+    copiées dans une table temporaire, puis fusionnées par INSERT ... ON CONFLICT.
+    En cas de doublon sur la clé de conflit, la dernière ligne fournie l'emporte.
+    La génération de la table (table_generation) est incrémentée dans la même transaction.
+    
+    Args:
+        cur: Curseur ouvert (la transaction est validée par l'appelant)
+        table: Table cible
+        columns: Colonnes des tuples de rows, dans l'ordre
+        conflict: Colonnes de la contrainte d'unicité
+        rows: Lignes à insérer
+    """
+    cols = ", ".join(columns)
+    keys = ", ".join(conflict)
+    updates = ",\n".join(f"{col} = EXCLUDED.{col}" for col in columns if col not in conflict)
+    cur.execute(f"CREATE TEMP TABLE tmp_{table} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA")
+    cur.execute(f"ALTER TABLE tmp_{table} ADD COLUMN ord bigserial")
+    with cur.copy(f"COPY tmp_{table} ({cols}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+    cur.execute(
+        f"""
+        INSERT INTO {table} ({cols})
+        SELECT DISTINCT ON ({keys}) {cols}
+        FROM tmp_{table}
+        ORDER BY {keys}, ord DESC
+        ON CONFLICT ({keys})
+        DO UPDATE SET
+            {updates},
+            inserted_at = now();
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO table_generation (table_name, generation) VALUES (%s, 1)
+        ON CONFLICT (table_name) DO UPDATE SET generation = table_generation.generation + 1
+        """,
+        (table,),
+    )
+
+
+def open_pool():
+    """Attend que le pool ait ouvert ses connexions minimales"""
+    POOL.wait()
+
+
+def close_pool():
+    """Ferme toutes les connexions du pool"""
+    POOL.close()
 
 
 def ensure_schema():
-    """Crée les tables si elles n'existent pas"""
+    """Crée les tables si elles n'existent pas
+    
+    Le DDL (et ses verrous) n'est rejoué que si l'empreinte en base diffère de SCHEMA_VERSION
+    (base vide ou nouveau schéma), puis plus du tout pour la durée de vie du processus.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(POINTAGE_SCHEMA)
-            cur.execute(LEAN_ACTION_SCHEMA)
-            cur.execute(MEETING_SUMMARY_SCHEMA)
-            cur.execute(INSPECTION_RECORD_SCHEMA)
-            cur.execute(LLTI_RECORD_SCHEMA)
-            
-            # Migration : Ajouter la colonne markdown_content si elle n'existe pas
-            try:
-                cur.execute("""
-                    ALTER TABLE meeting_summary 
-                    ADD COLUMN IF NOT EXISTS markdown_content text
-                """)
-            except Exception:
-                pass  # La colonne existe déjà ou erreur de migration
-            
-            # Migration : Supprimer l'ancienne colonne pdf_path si elle existe
-            try:
-                cur.execute("""
-                    ALTER TABLE meeting_summary 
-                    DROP COLUMN IF EXISTS pdf_path
-                """)
-            except Exception:
-                pass  # La colonne n'existe pas ou erreur de migration
+            cur.execute("SELECT obj_description(to_regclass('pointage'), 'pg_class')")
+            if cur.fetchone()[0] != SCHEMA_VERSION:
+                cur.execute(SCHEMA_DDL)
+                cur.execute(f"COMMENT ON TABLE pointage IS '{SCHEMA_VERSION}'")
         conn.commit()
-
+    _schema_ready = True
@@ -9,9 +9,14 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Categorical dtypes (int8 codes instead of Python strings)
+STATUT_DTYPE = pd.CategoricalDtype(['VERT', 'ORANGE', 'ROUGE', 'BLEU'])
+TYPE_JOUR_DTYPE = pd.CategoricalDtype(['ouvre', 'weekend'])
+# Severity order for anomalies (ROUGE > ORANGE > BLEU)
+SEVERITY_DTYPE = pd.CategoricalDtype(['ROUGE', 'ORANGE', 'BLEU', 'VERT'], ordered=True)
+
 
 class ExhaustivityController:
     """Control exhaustivity of timesheet data"""
@@ -43,22 +48,23 @@ class ExhaustivityController:
         # Generate date range
         date_range = pd.date_range(start=start_date, end=end_date, freq='D')
         
-        # Create DataFrame
+        # Create DataFrame with type_jour derived from the weekday array
+        weekday = date_range.weekday.to_numpy()  # 0=Monday, 6=Sunday
         df_calendar = pd.DataFrame({
             'date': date_range,
-            'jour_semaine': date_range.weekday,  # 0=Monday, 6=Sunday
+            'jour_semaine': weekday,
+            'type_jour': pd.Categorical(
+                np.where(weekday >= 5, 'weekend', 'ouvre'), dtype=TYPE_JOUR_DTYPE
+            ),
         })
         
-        # Add type_jour
-        df_calendar['type_jour'] = df_calendar['jour_semaine'].apply(
-            lambda x: 'weekend' if x >= 5 else 'ouvre'
-        )
-        
         # Filter weekends if needed
         if not include_weekends:
             df_calendar = df_calendar[df_calendar['type_jour'] == 'ouvre']
         
-        logger.info(f"Generated {len(df_calendar)} days ({df_calendar['type_jour'].value_counts().to_dict()})")
+        logger.info(f"Generated {len(df_calendar)} days")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Day types: %s", df_calendar['type_jour'].value_counts().to_dict())
         
         return df_calendar
     
@@ -81,25 +87,25 @@ class ExhaustivityController:
         
         # Add day of week
         df_exh['jour_semaine'] = df_exh['date'].dt.weekday
-        df_exh['type_jour'] = df_exh['jour_semaine'].apply(
-            lambda x: 'weekend' if x >= 5 else 'ouvre'
+        is_weekend = df_exh['jour_semaine'].to_numpy() >= 5
+        df_exh['type_jour'] = pd.Categorical.from_codes(
+            is_weekend.astype(np.int8), dtype=TYPE_JOUR_DTYPE
         )
         
-        # Determine status
-        def get_status(row):
-            hr = row['heures_totales']
-            is_weekend = row['type_jour'] == 'weekend'
-            
-            if hr == 0:
-                return 'VERT' if is_weekend else 'ROUGE'
-            elif hr < 8:
-                return 'ORANGE'
-            elif hr == 8:
-                return 'VERT'
-            else:  # hr > 8
-                return 'BLEU'
-        
-        df_exh['statut_exhaustivite'] = df_exh.apply(get_status, axis=1)
+        # Determine status as int8 codes into STATUT_DTYPE (first matching condition wins)
+        vert, orange, rouge, bleu = (np.int8(code) for code in range(len(STATUT_DTYPE.categories)))
+        hr = df_exh['heures_totales'].to_numpy()
+        codes = np.select(
+            [
+                (hr == 0) & is_weekend,  # weekend with 0h
+                hr == 0,                 # missing working day
+                hr < 8,                  # incomplete
+                hr == 8,                 # normal
+            ],
+            [vert, rouge, orange, vert],
+            default=bleu  # hr > 8 (overtime)
+        )
+        df_exh['statut_exhaustivite'] = pd.Categorical.from_codes(codes, dtype=STATUT_DTYPE)
         
         # Select relevant columns
         df_exh = df_exh[[
@@ -108,7 +114,8 @@ class ExhaustivityController:
         ]]
         
         logger.info(f"Exhaustivity checked: {len(df_exh)} employee-days")
-        logger.info(f"Status distribution: {df_exh['statut_exhaustivite'].value_counts().to_dict()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Status distribution: %s", df_exh['statut_exhaustivite'].value_counts().to_dict())
         
         return df_exh
     
@@ -130,77 +137,84 @@ class ExhaustivityController:
         logger.info(f"Calculating exhaustivity rate by {by}...")
         
         # Filter only working days for rate calculation
-        df_work = df_exhaustivity[df_exhaustivity['type_jour'] == 'ouvre'].copy()
+        df_work = df_exhaustivity[df_exhaustivity['type_jour'] == 'ouvre']
         
         if by == 'global':
+            counts = df_work['statut_exhaustivite'].value_counts()
             total_days = len(df_work)
-            compliant_days = len(df_work[df_work['statut_exhaustivite'] == 'VERT'])
+            compliant_days = int(counts.get('VERT', 0))
             rate = (compliant_days / total_days * 100) if total_days > 0 else 0
             
             result = pd.DataFrame([{
                 'scope': 'Global',
                 'jours_total': total_days,
                 'jours_conformes': compliant_days,
-                'jours_incomplets': len(df_work[df_work['statut_exhaustivite'] == 'ORANGE']),
-                'jours_manquants': len(df_work[df_work['statut_exhaustivite'] == 'ROUGE']),
-                'jours_heures_sup': len(df_work[df_work['statut_exhaustivite'] == 'BLEU']),
+                'jours_incomplets': int(counts.get('ORANGE', 0)),
+                'jours_manquants': int(counts.get('ROUGE', 0)),
+                'jours_heures_sup': int(counts.get('BLEU', 0)),
                 'taux_exhaustivite_pct': round(rate, 2)
             }])
             
         elif by == 'team':
-            result = df_work.groupby('equipe').apply(
-                lambda x: pd.Series({
-                    'jours_total': len(x),
-                    'jours_conformes': len(x[x['statut_exhaustivite'] == 'VERT']),
-                    'jours_incomplets': len(x[x['statut_exhaustivite'] == 'ORANGE']),
-                    'jours_manquants': len(x[x['statut_exhaustivite'] == 'ROUGE']),
-                    'jours_heures_sup': len(x[x['statut_exhaustivite'] == 'BLEU']),
-                    'nb_salaries': x['salarie_id'].nunique(),
-                    'taux_exhaustivite_pct': round(
-                        (len(x[x['statut_exhaustivite'] == 'VERT']) / len(x) * 100) if len(x) > 0 else 0,
-                        2
-                    )
-                })
-            ).reset_index()
+            result = self._aggregate_status_counts(df_work, ['equipe'], nb_salaries=True)
             
         elif by == 'employee':
-            result = df_work.groupby(['salarie_id', 'salarie_nom', 'equipe']).apply(
-                lambda x: pd.Series({
-                    'jours_total': len(x),
-                    'jours_conformes': len(x[x['statut_exhaustivite'] == 'VERT']),
-                    'jours_incomplets': len(x[x['statut_exhaustivite'] == 'ORANGE']),
-                    'jours_manquants': len(x[x['statut_exhaustivite'] == 'ROUGE']),
-                    'jours_heures_sup': len(x[x['statut_exhaustivite'] == 'BLEU']),
-                    'taux_exhaustivite_pct': round(
-                        (len(x[x['statut_exhaustivite'] == 'VERT']) / len(x) * 100) if len(x) > 0 else 0,
-                        2
-                    )
-                })
-            ).reset_index()
+            result = self._aggregate_status_counts(
+                df_work, ['salarie_id', 'salarie_nom', 'equipe'], nb_salaries=False
+            )
             
         elif by == 'month':
-            df_work['annee'] = df_work['date'].dt.year
-            df_work['mois'] = df_work['date'].dt.month
+            # Single date pass: group by monthly period, split into annee/mois per group only
+            df_work = df_work.assign(year_month=df_work['date'].dt.to_period('M'))
             
-            result = df_work.groupby(['equipe', 'annee', 'mois']).apply(
-                lambda x: pd.Series({
-                    'jours_total': len(x),
-                    'jours_conformes': len(x[x['statut_exhaustivite'] == 'VERT']),
-                    'jours_incomplets': len(x[x['statut_exhaustivite'] == 'ORANGE']),
-                    'jours_manquants': len(x[x['statut_exhaustivite'] == 'ROUGE']),
-                    'jours_heures_sup': len(x[x['statut_exhaustivite'] == 'BLEU']),
-                    'nb_salaries': x['salarie_id'].nunique(),
-                    'taux_exhaustivite_pct': round(
-                        (len(x[x['statut_exhaustivite'] == 'VERT']) / len(x) * 100) if len(x) > 0 else 0,
-                        2
-                    )
-                })
-            ).reset_index()
+            result = self._aggregate_status_counts(
+                df_work, ['equipe', 'year_month'], nb_salaries=True
+            )
+            result.insert(1, 'annee', result['year_month'].dt.year)
+            result.insert(2, 'mois', result['year_month'].dt.month)
+            result = result.drop('year_month', axis=1)
         
         logger.info(f"Exhaustivity rate calculated: {len(result)} records")
         
         return result
     
+    @staticmethod
+    def _aggregate_status_counts(df_work: pd.DataFrame, keys: List[str],
+                                 nb_salaries: bool) -> pd.DataFrame:
+        """
+        Count statuses per group in a single groupby pass
+        
+        Args:
+            df_work: Working-day exhaustivity DataFrame
+            keys: Grouping columns
+            nb_salaries: If True, add the number of distinct employees per group
+        
+        Returns:
+            DataFrame with one row per group and the jours_* / taux columns
+        """
+        grouped = df_work.groupby(keys, sort=False, observed=True)
+        counts = (
+            df_work.groupby(keys + ['statut_exhaustivite'], sort=False, observed=True).size()
+            .unstack(fill_value=0)
+            .reindex(columns=STATUT_DTYPE.categories, fill_value=0)
+        )
+        
+        result = pd.DataFrame({
+            'jours_total': grouped.size(),
+            'jours_conformes': counts['VERT'],
+            'jours_incomplets': counts['ORANGE'],
+            'jours_manquants': counts['ROUGE'],
+            'jours_heures_sup': counts['BLEU'],
+        })
+        if nb_salaries:
+            result['nb_salaries'] = grouped['salarie_id'].nunique()
+        result['taux_exhaustivite_pct'] = (
+            result['jours_conformes'] / result['jours_total'] * 100
+        ).round(2)
+        
+        # Groups come out unsorted; sort the (small) result once by key
+        return result.sort_index().reset_index()
+    
     def detect_anomalies(self, df_exhaustivity: pd.DataFrame = None,
                         anomaly_types: List[str] = None) -> pd.DataFrame:
         """
@@ -227,14 +241,13 @@ class ExhaustivityController:
             df_exhaustivity['statut_exhaustivite'].isin(anomaly_types)
         ].copy()
         
-        # Sort by severity (ROUGE > ORANGE > BLEU)
-        severity_order = {'ROUGE': 1, 'ORANGE': 2, 'BLEU': 3}
-        df_anomalies['severity'] = df_anomalies['statut_exhaustivite'].map(severity_order)
-        df_anomalies = df_anomalies.sort_values(['severity', 'date', 'equipe', 'salarie_nom'])
-        df_anomalies = df_anomalies.drop('severity', axis=1)
+        # Sort by severity (ROUGE > ORANGE > BLEU) on ordered categorical codes
+        df_anomalies['statut_exhaustivite'] = df_anomalies['statut_exhaustivite'].astype(SEVERITY_DTYPE)
+        df_anomalies = df_anomalies.sort_values(['statut_exhaustivite', 'date', 'equipe', 'salarie_nom'])
         
         logger.info(f"Detected {len(df_anomalies)} anomalies")
-        logger.info(f"Breakdown: {df_anomalies['statut_exhaustivite'].value_counts().to_dict()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Breakdown: %s", df_anomalies['statut_exhaustivite'].value_counts().to_dict())
         
         return df_anomalies
     
@@ -257,76 +270,22 @@ class ExhaustivityController:
         # Get unique employees
         employees = self.df_daily[['salarie_id', 'salarie_nom', 'equipe']].drop_duplicates()
         
-        # Create expected employee-days (Cartesian product)
-        expected_records = []
-        for _, emp in employees.iterrows():
-            for _, day in df_expected.iterrows():
-                expected_records.append({
-                    'salarie_id': emp['salarie_id'],
-                    'salarie_nom': emp['salarie_nom'],
-                    'equipe': emp['equipe'],
-                    'date': day['date']
-                })
-        
-        df_expected_all = pd.DataFrame(expected_records)
+        # Create expected employee-days (Cartesian product, single C-level join)
+        df_expected_all = employees.merge(df_expected[['date']], how='cross')
         
         # Get actual records
-        df_actual = self.df_daily[['salarie_id', 'date']].copy()
-        df_actual['has_record'] = True
+        df_actual = self.df_daily[['salarie_id', 'date']].drop_duplicates()
         
-        # Merge to find missing
+        # Anti-join to find missing
         df_merged = df_expected_all.merge(
             df_actual,
             on=['salarie_id', 'date'],
-            how='left'
+            how='left',
+            indicator=True
         )
         
-        df_missing = df_merged[df_merged['has_record'].isna()].copy()
-        df_missing = df_missing.drop('has_record', axis=1)
+        df_missing = df_merged[df_merged['_merge'] == 'left_only'].drop('_merge', axis=1)
         
         logger.info(f"Found {len(df_missing)} missing employee-days")
         
         return df_missing
-
-
-if __name__ == "__main__":
-    # Test the controller
-    from productivity_loader import ProductivityDataLoader
-    from productivity_calculator import ProductivityCalculator
-    
-    # Load and calculate
-    loader = ProductivityDataLoader()
-    df_raw, summary = loader.load_and_prepare()
-    
-    calc = ProductivityCalculator(df_raw)
-    df_daily = calc.calculate_productivity_daily()
-    
-    # Exhaustivity control
-    controller = ExhaustivityController(df_daily)
-    
-    # Check exhaustivity
-    df_exh = controller.check_exhaustivity_daily()
-    print("\n=== EXHAUSTIVITY STATUS (Sample) ===")
-    print(df_exh.head(10))
-    print(f"\nStatus distribution:")
-    print(df_exh['statut_exhaustivite'].value_counts())
-    
-    # Calculate rates
-    print("\n=== GLOBAL EXHAUSTIVITY RATE ===")
-    rate_global = controller.calculate_exhaustivity_rate(df_exh, by='global')
-    print(rate_global)
-    
-    print("\n=== EXHAUSTIVITY RATE BY TEAM ===")
-    rate_team = controller.calculate_exhaustivity_rate(df_exh, by='team')
-    print(rate_team.sort_values('taux_exhaustivite_pct', ascending=False))
-    
-    # Detect anomalies
-    print("\n=== CRITICAL ANOMALIES (ROUGE) ===")
-    anomalies_rouge = controller.detect_anomalies(df_exh, anomaly_types=['ROUGE'])
-    print(f"Total: {len(anomalies_rouge)} missing days")
-    print(anomalies_rouge.head(10))
-    
-    print("\n=== INCOMPLETE DAYS (ORANGE) ===")
-    anomalies_orange = controller.detect_anomalies(df_exh, anomaly_types=['ORANGE'])
-    print(f"Total: {len(anomalies_orange)} incomplete days")
-    print(anomalies_orange.head(10))
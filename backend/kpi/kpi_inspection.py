@@ -4,6 +4,20 @@ from datetime import date
 from typing import Any, Dict
 
 
+def _or_inspected(df: pd.DataFrame, keys: list[str]) -> pd.Series:
+    """Statut d'inspection par OR : True si au moins une ligne est "Inspecté"
+    
+    Args:
+        df: DataFrame préprocessé avec colonnes: is_inspected et les colonnes de `keys`
+        keys: Colonnes de regroupement (se terminant par or_segment)
+        
+    Returns:
+        Série booléenne indexée par `keys`
+    """
+    inspected = df["is_inspected"].eq("Inspecté")
+    return inspected.groupby([df[k] for k in keys], sort=False, observed=True).max()
+
+
 def calculate_inspection_rate(df: pd.DataFrame) -> Dict[str, Any]:
     """Calcule le taux d'inspection global
     
@@ -22,12 +36,10 @@ def calculate_inspection_rate(df: pd.DataFrame) -> Dict[str, Any]:
         }
 
     # Calcul basé sur les OR uniques
-    or_status = df.groupby("or_segment").agg({
-        "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-    }).reset_index()
+    or_status = _or_inspected(df, ["or_segment"])
     
     total_or = len(or_status)
-    inspected_or = len(or_status[or_status["is_inspected"] == "Inspecté"])
+    inspected_or = int(or_status.sum())
     not_inspected_or = total_or - inspected_or
     inspection_rate = (inspected_or / total_or * 100) if total_or > 0 else 0.0
     
@@ -75,15 +87,12 @@ def calculate_by_atelier(df: pd.DataFrame) -> list[Dict[str, Any]]:
     if df.empty or "atelier" not in df.columns or df["atelier"].isna().all():
         return []
 
-    atelier_or_stats = df.groupby(["atelier", "or_segment"]).agg({
-        "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-    }).reset_index()
+    atelier_or_stats = _or_inspected(df, ["atelier", "or_segment"])
     
-    atelier_stats = atelier_or_stats.groupby("atelier").agg({
-        "or_segment": "count",
-        "is_inspected": lambda x: (x == "Inspecté").sum(),
-    }).reset_index()
-    atelier_stats.columns = ["atelier", "total", "inspected"]
+    atelier_stats = atelier_or_stats.groupby(level="atelier", observed=True).agg(
+        total="count",
+        inspected="sum",
+    ).reset_index().astype({"atelier": str})
     atelier_stats["rate"] = (atelier_stats["inspected"] / atelier_stats["total"] * 100).round(2)
     
     return atelier_stats.fillna("").to_dict(orient="records")
@@ -101,15 +110,12 @@ def calculate_by_type_materiel(df: pd.DataFrame) -> list[Dict[str, Any]]:
     if df.empty or "type_materiel" not in df.columns or df["type_materiel"].isna().all():
         return []
 
-    type_or_stats = df.groupby(["type_materiel", "or_segment"]).agg({
-        "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-    }).reset_index()
+    type_or_stats = _or_inspected(df, ["type_materiel", "or_segment"])
     
-    type_stats = type_or_stats.groupby("type_materiel").agg({
-        "or_segment": "count",
-        "is_inspected": lambda x: (x == "Inspecté").sum(),
-    }).reset_index()
-    type_stats.columns = ["type_materiel", "total", "inspected"]
+    type_stats = type_or_stats.groupby(level="type_materiel", observed=True).agg(
+        total="count",
+        inspected="sum",
+    ).reset_index().astype({"type_materiel": str})
     type_stats["rate"] = (type_stats["inspected"] / type_stats["total"] * 100).round(2)
     
     return type_stats.fillna("").to_dict(orient="records")
@@ -132,17 +138,17 @@ def calculate_by_technicien(df: pd.DataFrame) -> list[Dict[str, Any]]:
     if df_with_tech.empty:
         return []
 
-    tech_or_stats = df_with_tech.groupby(["technicien", "or_segment"]).agg({
-        "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté",
-        "equipe": "first",
-    }).reset_index()
-    
-    tech_stats = tech_or_stats.groupby("technicien").agg({
-        "or_segment": "count",
-        "is_inspected": lambda x: (x == "Inspecté").sum(),
-        "equipe": "first",
-    }).reset_index()
-    tech_stats.columns = ["technicien", "total_or", "inspected_or", "equipe"]
+    # Tri explicite : l'équipe retenue est celle du premier OR (par numéro) du technicien
+    tech_or_stats = pd.DataFrame({
+        "is_inspected": _or_inspected(df_with_tech, ["technicien", "or_segment"]),
+        "equipe": df_with_tech.groupby(["technicien", "or_segment"], sort=False, observed=True)["equipe"].first(),
+    }).sort_index()
+    
+    tech_stats = tech_or_stats.groupby(level="technicien", observed=True).agg(
+        total_or=("is_inspected", "count"),
+        inspected_or=("is_inspected", "sum"),
+        equipe=("equipe", "first"),
+    ).reset_index().astype({"technicien": str, "equipe": str})
     tech_stats["rate"] = (tech_stats["inspected_or"] / tech_stats["total_or"] * 100).round(2)
     tech_stats = tech_stats.sort_values("rate", ascending=False)
     
@@ -178,13 +184,17 @@ def calculate_full_inspection_analytics(
     by_type_materiel = calculate_by_type_materiel(df)
     by_technicien = calculate_by_technicien(df)
     
-    # Statistiques sur les lignes (pour référence)
+    # Statistiques sur les lignes (pour référence) : un seul comptage, sans filtrer le DataFrame
     total_lines = len(df)
-    inspected_lines = len(df[df["is_inspected"] == "Inspecté"])
-    not_inspected_lines = len(df[df["is_inspected"] == "Non Inspecté"])
-    
-    # Records limités
-    records = df.head(100).to_dict(orient="records")
+    line_counts = df["is_inspected"].value_counts()
+    inspected_lines = int(line_counts.get("Inspecté", 0))
+    not_inspected_lines = int(line_counts.get("Non Inspecté", 0))
+    
+    # Records limités (dates déjà en ISO : types JSON natifs, rien à réencoder côté FastAPI)
+    records_df = df.head(100)
+    records = records_df.assign(
+        date_facture=records_df["date_facture"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    ).to_dict(orient="records")
     
     return {
         "total": rate_data["total"],
@@ -1,4 +1,5 @@
 """Calculs KPI LLTI (Lead Time to Invoice)"""
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, List
 
@@ -28,12 +29,15 @@ def calculate_global_llti(df: pd.DataFrame) -> Dict[str, Any]:
             "status": "N/A",
         }
     
-    moyenne = float(df[STANDARDIZED_LLTI_JOURS].mean())
-    mediane = float(df[STANDARDIZED_LLTI_JOURS].median())
+    # Une seule extraction de la colonne (NaN retirés une fois) ; np.median sélectionne sans tri complet
+    llti = df[STANDARDIZED_LLTI_JOURS].dropna().to_numpy(dtype=float)
+    moyenne = float(llti.mean())
+    mediane = float(np.median(llti))
     # Nombre de factures uniques (pas le nombre de lignes)
     col_facture = "N° Facture (Lignes)"
     if col_facture in df.columns:
-        total = int(df[col_facture].nunique())
+        factures = pd.unique(df[col_facture].to_numpy())
+        total = int(pd.notna(factures).sum())  # comme nunique() : NaN exclus
     else:
         total = len(df)
     
@@ -55,12 +59,13 @@ def calculate_global_llti(df: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
-def calculate_llti_by_client(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def calculate_llti_by_client(df: pd.DataFrame, top_n: int | None = None) -> List[Dict[str, Any]]:
     """
     Calcule le LLTI par client
     
     Args:
         df: DataFrame préprocessé avec colonnes LLTI_jours et Nom Client OR (or)
+        top_n: Si fourni, ne garde que les top_n meilleurs clients (tri partiel)
     Returns:
         Liste de dicts avec: client, moyenne_llti, total_factures
     """
@@ -78,20 +83,24 @@ def calculate_llti_by_client(df: pd.DataFrame) -> List[Dict[str, Any]]:
             total_factures=(STANDARDIZED_LLTI_JOURS, "count")
         )
         .reset_index()
-        .sort_values("moyenne_llti")
     )
+    if top_n is not None:
+        by_client = by_client.nsmallest(top_n, "moyenne_llti")
+    else:
+        by_client = by_client.sort_values("moyenne_llti")
     
     by_client["moyenne_llti"] = by_client["moyenne_llti"].round(2)
     
     return by_client.to_dict(orient="records")
 
 
-def calculate_llti_by_or(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def calculate_llti_by_or(df: pd.DataFrame, top_n: int | None = None) -> List[Dict[str, Any]]:
     """
     Calcule le LLTI par OR (Order of Repair)
     
     Args:
         df: DataFrame préprocessé avec colonnes LLTI_jours et N° OR (Segment)
+        top_n: Si fourni, ne garde que les top_n OR au LLTI le plus long (tri partiel)
     Returns:
         Liste de dicts avec: or_numero, llti_jours, date_facture, date_pointage
     """
@@ -111,7 +120,7 @@ def calculate_llti_by_or(df: pd.DataFrame) -> List[Dict[str, Any]]:
     ]
     
     available_cols = [c for c in cols_to_keep if c in df.columns]
-    result_df = df[available_cols].copy()
+    result_df = df[available_cols]
     
     # Renommer pour l'API
     result_df = result_df.rename(columns={
@@ -122,12 +131,19 @@ def calculate_llti_by_or(df: pd.DataFrame) -> List[Dict[str, Any]]:
         STANDARDIZED_LLTI_JOURS: "llti_jours",
     })
     
-    # Convertir les dates en string pour JSON
+    # Tri décroissant comme dans Streamlit (partiel si top_n), avant formatage des dates
+    if top_n is not None:
+        result_df = result_df.nlargest(top_n, "llti_jours")
+    else:
+        result_df = result_df.sort_values("llti_jours", ascending=False)
+    
+    # Convertir les dates en string pour JSON (datetime64[D] s'affiche nativement en YYYY-MM-DD)
     for col in ["date_facture", "date_pointage"]:
         if col in result_df.columns:
-            result_df[col] = result_df[col].dt.strftime("%Y-%m-%d")
-    
-    result_df = result_df.sort_values("llti_jours", ascending=False)  # Tri décroissant comme dans Streamlit
+            dates = result_df[col].to_numpy(dtype="datetime64[ns]")
+            as_str = dates.astype("datetime64[D]").astype(str).astype(object)
+            as_str[np.isnat(dates)] = None
+            result_df[col] = as_str
     
     return result_df.to_dict(orient="records")
 
@@ -149,12 +165,13 @@ def calculate_llti_distribution(df: pd.DataFrame) -> Dict[str, int]:
             "a_ameliorer": 0,
         }
     
-    excellent = len(df[df[STANDARDIZED_LLTI_JOURS] < EXCELLENT_THRESHOLD])
-    advanced = len(df[(df[STANDARDIZED_LLTI_JOURS] >= EXCELLENT_THRESHOLD) & 
-                      (df[STANDARDIZED_LLTI_JOURS] < ADVANCED_THRESHOLD)])
-    emerging = len(df[(df[STANDARDIZED_LLTI_JOURS] >= ADVANCED_THRESHOLD) & 
-                      (df[STANDARDIZED_LLTI_JOURS] <= EMERGING_THRESHOLD)])
-    a_ameliorer = len(df[df[STANDARDIZED_LLTI_JOURS] > EMERGING_THRESHOLD])
+    # Une seule passe : indice de catégorie 0..3 (< 7 | [7, 17[ | [17, 21] | > 21), puis comptage
+    llti = df[STANDARDIZED_LLTI_JOURS].dropna().to_numpy()
+    categorie = (
+        np.searchsorted([EXCELLENT_THRESHOLD, ADVANCED_THRESHOLD], llti, side="right")
+        + (llti > EMERGING_THRESHOLD)
+    )
+    excellent, advanced, emerging, a_ameliorer = np.bincount(categorie, minlength=4)
     
     return {
         "excellent": int(excellent),
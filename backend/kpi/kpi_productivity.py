@@ -1,7 +1,9 @@
 """Calculs KPI de productivité à partir de données préprocessées
 Basé sur la logique du code Streamlit fourni"""
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, List
+from utils.ratios import safe_ratio
 
 
 # ==================================================
@@ -14,6 +16,37 @@ COL_HEURES = "Hr_travaillée"  # Note: dans le code actuel c'est "Hr_Totale", à
 COL_DATE = "Saisie heures - Date"
 
 
+def _sum_hours(df: pd.DataFrame, by, **groupby_kwargs) -> pd.DataFrame:
+    """Somme heures travaillées / facturables par groupe en une seule réduction
+
+    Sélectionner les deux colonnes puis appeler sum() réduit le bloc 2D en une passe
+    (un seul calcul des codes de groupe), là où .agg(heures_trav=..., heures_fact=...)
+    lance une réduction par colonne.
+
+    Returns:
+        DataFrame indexé par les clés de groupement avec: heures_trav, heures_fact
+    """
+    return (
+        df.groupby(by, **groupby_kwargs)[["Heures_travaillées", "Heures_facturables"]]
+        .sum()
+        .set_axis(["heures_trav", "heures_fact"], axis=1)
+    )
+
+
+def aggregate_monthly_hours(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrège les heures par (Mois, équipe), résultat intermédiaire partagé par les calculs mensuels
+    
+    Les lignes sans équipe sont conservées (elles comptent dans la série globale).
+    
+    Args:
+        df: DataFrame préprocessé avec colonnes: Mois, Salarié - Equipe(Nom), Heures_travaillées, Heures_facturables
+        
+    Returns:
+        DataFrame indexé par (Mois, Salarié - Equipe(Nom)) avec: heures_trav, heures_fact
+    """
+    return _sum_hours(df, ["Mois", COL_EQUIPE], dropna=False)
+
+
 def calculate_global_productivity(df: pd.DataFrame) -> Dict[str, float]:
     """Calcule les KPIs globaux de productivité
     
@@ -55,29 +88,26 @@ def calculate_technician_productivity(df: pd.DataFrame) -> List[Dict[str, Any]]:
     if df.empty:
         return []
 
-    prod_tech = (
-        df.groupby(COL_TECHNICIEN)
-        .agg(
-            heures_trav=("Heures_travaillées", "sum"),
-            heures_fact=("Heures_facturables", "sum")
-        )
-        .reset_index()
-    )
+    prod_tech = _sum_hours(df, COL_TECHNICIEN).reset_index()
 
-    prod_tech["Productivité"] = (
-        prod_tech["heures_fact"] / prod_tech["heures_trav"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    prod_tech["Productivité"] = safe_ratio(
+        prod_tech["heures_fact"], prod_tech["heures_trav"], positive_only=False
+    )
 
     prod_tech = prod_tech.sort_values("Productivité", ascending=False)
 
     return prod_tech.to_dict(orient="records")
 
 
-def calculate_monthly_productivity(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def calculate_monthly_productivity(
+    df: pd.DataFrame,
+    monthly_hours: pd.DataFrame | None = None
+) -> List[Dict[str, Any]]:
     """Calcule la productivité mensuelle globale
     
     Args:
         df: DataFrame préprocessé avec colonnes: Mois, Heures_travaillées, Heures_facturables
+        monthly_hours: Résultat de aggregate_monthly_hours(df), réutilisé s'il est fourni (optionnel)
         
     Returns:
         Liste de dicts avec: Mois, heures_trav, heures_fact, Productivité globale, triée par Mois
@@ -85,19 +115,15 @@ def calculate_monthly_productivity(df: pd.DataFrame) -> List[Dict[str, Any]]:
     if df.empty:
         return []
 
-    prod_mois_global = (
-        df.groupby("Mois")
-        .agg(
-            heures_trav=("Heures_travaillées", "sum"),
-            heures_fact=("Heures_facturables", "sum")
-        )
-        .reset_index()
-        .sort_values("Mois")
-    )
+    if monthly_hours is not None:
+        mois_hours = monthly_hours.groupby(level="Mois").sum()
+    else:
+        mois_hours = _sum_hours(df, "Mois")
+    prod_mois_global = mois_hours.reset_index().sort_values("Mois")
 
-    prod_mois_global["Productivité globale"] = (
-        prod_mois_global["heures_fact"] / prod_mois_global["heures_trav"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    prod_mois_global["Productivité globale"] = safe_ratio(
+        prod_mois_global["heures_fact"], prod_mois_global["heures_trav"], positive_only=False
+    )
 
     return prod_mois_global.to_dict(orient="records")
 
@@ -114,28 +140,26 @@ def calculate_team_productivity(df: pd.DataFrame) -> List[Dict[str, Any]]:
     if df.empty:
         return []
 
-    team_agg = (
-        df.groupby(COL_EQUIPE)
-        .agg(
-            heures_trav=("Heures_travaillées", "sum"),
-            heures_fact=("Heures_facturables", "sum")
-        )
-        .reset_index()
-    )
+    team_agg = _sum_hours(df, COL_EQUIPE).reset_index()
 
-    team_agg["Productivité"] = (
-        team_agg["heures_fact"] / team_agg["heures_trav"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    team_agg["Productivité"] = safe_ratio(
+        team_agg["heures_fact"], team_agg["heures_trav"], positive_only=False
+    )
 
     return team_agg.to_dict(orient="records")
 
 
-def calculate_team_monthly_productivity(df: pd.DataFrame, equipe: str) -> List[Dict[str, Any]]:
+def calculate_team_monthly_productivity(
+    df: pd.DataFrame,
+    equipe: str,
+    monthly_hours: pd.DataFrame | None = None
+) -> List[Dict[str, Any]]:
     """Calcule la productivité mensuelle pour une équipe spécifique
     
     Args:
         df: DataFrame préprocessé avec colonnes: Salarié - Equipe(Nom), Mois, Heures_travaillées, Heures_facturables
         equipe: Nom de l'équipe à analyser
+        monthly_hours: Résultat de aggregate_monthly_hours(df), réutilisé s'il est fourni (optionnel)
         
     Returns:
         Liste de dicts avec: Mois, heures_trav, heures_fact, Productivité équipe
@@ -143,33 +167,35 @@ def calculate_team_monthly_productivity(df: pd.DataFrame, equipe: str) -> List[D
     if df.empty:
         return []
 
-    df_eq = df[df[COL_EQUIPE] == equipe]
+    if monthly_hours is not None:
+        if equipe not in monthly_hours.index.get_level_values(COL_EQUIPE):
+            return []
+        mois_hours = monthly_hours.xs(equipe, level=COL_EQUIPE)
+    else:
+        df_eq = df[df[COL_EQUIPE] == equipe]
 
-    if df_eq.empty:
-        return []
+        if df_eq.empty:
+            return []
 
-    prod_mois_eq = (
-        df_eq.groupby("Mois")
-        .agg(
-            heures_trav=("Heures_travaillées", "sum"),
-            heures_fact=("Heures_facturables", "sum")
-        )
-        .reset_index()
-        .sort_values("Mois")
-    )
+        mois_hours = _sum_hours(df_eq, "Mois")
+    prod_mois_eq = mois_hours.reset_index().sort_values("Mois")
 
-    prod_mois_eq["Productivité équipe"] = (
-        prod_mois_eq["heures_fact"] / prod_mois_eq["heures_trav"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    prod_mois_eq["Productivité équipe"] = safe_ratio(
+        prod_mois_eq["heures_fact"], prod_mois_eq["heures_trav"], positive_only=False
+    )
 
     return prod_mois_eq.to_dict(orient="records")
 
 
-def calculate_correlation_driver(df: pd.DataFrame) -> Dict[str, Any] | None:
+def calculate_correlation_driver(
+    df: pd.DataFrame,
+    monthly_hours: pd.DataFrame | None = None
+) -> Dict[str, Any] | None:
     """Calcule l'équipe driver (corrélation avec la productivité globale mensuelle)
     
     Args:
         df: DataFrame préprocessé avec colonnes: Mois, Salarié - Equipe(Nom), Heures_travaillées, Heures_facturables
+        monthly_hours: Résultat de aggregate_monthly_hours(df), réutilisé s'il est fourni (optionnel)
         
     Returns:
         Dict avec: equipe, score (corrélation), ou None si pas de corrélation
@@ -177,71 +203,58 @@ def calculate_correlation_driver(df: pd.DataFrame) -> Dict[str, Any] | None:
     if df.empty:
         return None
 
-    # Série globale mensuelle (référence)
-    global_ts = (
-        df.groupby("Mois")
-        .agg(
-            heures_trav=("Heures_travaillées", "sum"),
-            heures_fact=("Heures_facturables", "sum")
-        )
-        .reset_index()
-        .sort_values("Mois")
-    )
-
-    global_ts["Productivité globale"] = (
-        global_ts["heures_fact"] / global_ts["heures_trav"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
-
-    # Équipes analysées
-    equipes_corr = sorted(df[COL_EQUIPE].dropna().unique())
-    correlations = []
-
-    for equipe in equipes_corr:
-        df_eq = df[df[COL_EQUIPE] == equipe]
-
-        eq_ts = (
-            df_eq.groupby("Mois")
-            .agg(
-                heures_trav=("Heures_travaillées", "sum"),
-                heures_fact=("Heures_facturables", "sum")
-            )
-            .reset_index()
-            .sort_values("Mois")
-        )
+    # Une seule agrégation (mois × équipe) ; les lignes sans équipe comptent dans la série globale
+    agg = monthly_hours if monthly_hours is not None else aggregate_monthly_hours(df)
 
-        eq_ts["Productivité équipe"] = (
-            eq_ts["heures_fact"] / eq_ts["heures_trav"]
-        ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    # Série globale mensuelle (référence), réutilise les sommes déjà agrégées
+    global_sums = agg.groupby(level="Mois").sum()
+    global_prod = pd.Series(
+        safe_ratio(global_sums["heures_fact"], global_sums["heures_trav"], positive_only=False),
+        index=global_sums.index
+    )
 
-        # Fusion équipe vs global
-        merged = pd.merge(
-            global_ts[["Mois", "Productivité globale"]],
-            eq_ts[["Mois", "Productivité équipe"]],
-            on="Mois",
-            how="inner"
-        )
+    # Productivité mensuelle de toutes les équipes : (mois × équipes), NaN si l'équipe n'a pas pointé ce mois
+    team_prod = pd.Series(
+        safe_ratio(agg["heures_fact"], agg["heures_trav"], positive_only=False), index=agg.index
+    ).unstack(COL_EQUIPE)
+    team_prod = team_prod.loc[:, team_prod.columns.notna()]
 
-        if len(merged) < 2:  # Besoin d'au moins 2 points pour corrélation
-            continue
+    # Corrélation de chaque équipe avec la série globale (mois communs, au moins 2 points)
+    correlations = team_prod.corrwith(global_prod).dropna()
 
-        # Corrélation
-        corr = merged["Productivité globale"].corr(merged["Productivité équipe"])
+    if correlations.empty:
+        return None
 
-        if not pd.isna(corr):
-            correlations.append({
-                "Équipe": equipe,
-                "Corrélation": corr
-            })
+    return {
+        "equipe": correlations.idxmax(),
+        "score": float(correlations.max()),
+    }
 
-    if not correlations:
-        return None
 
-    corr_df = pd.DataFrame(correlations)
-    equipe_driver = corr_df.sort_values("Corrélation", ascending=False).iloc[0]
+def calculate_all_productivity_analytics(df: pd.DataFrame) -> Dict[str, Any]:
+    """Calcule tous les analytics de productivité à partir d'un DataFrame préprocessé
+    
+    L'agrégation (Mois, équipe) est calculée une seule fois et partagée entre la série
+    mensuelle globale, les séries mensuelles par équipe et l'équipe driver.
+    
+    Args:
+        df: DataFrame préprocessé (voir preprocess_productivity_df)
+    Returns:
+        Dict avec tous les analytics
+    """
+    monthly_hours = aggregate_monthly_hours(df) if not df.empty else None
+    equipes = sorted(df[COL_EQUIPE].dropna().unique()) if not df.empty else []
 
     return {
-        "equipe": equipe_driver["Équipe"],
-        "score": float(equipe_driver["Corrélation"]),
+        "global": calculate_global_productivity(df),
+        "by_technicien": calculate_technician_productivity(df),
+        "monthly": calculate_monthly_productivity(df, monthly_hours),
+        "by_team": calculate_team_productivity(df),
+        "team_monthly": {
+            equipe: calculate_team_monthly_productivity(df, equipe, monthly_hours)
+            for equipe in equipes
+        },
+        "driver": calculate_correlation_driver(df, monthly_hours),
     }
 
 
@@ -274,7 +287,7 @@ def calculate_exhaustivity(
     df_cal = df[
         (df[COL_EQUIPE] == equipe) &
         (df["Mois_periode"] == mois_periode)
-    ].copy()
+    ]
 
     if df_cal.empty:
         return {
@@ -298,37 +311,35 @@ def calculate_exhaustivity(
     daily["Jour"] = daily[COL_DATE].dt.day
     daily["Jour_semaine"] = daily[COL_DATE].dt.weekday  # 0=lundi
 
-    # Règles métier exhaustivité
-    def statut_pointage(h, wd):
-        if wd >= 5:  # samedi / dimanche
-            return "Weekend OK" if h == 0 else "Travail weekend"
-        if h == 0:
-            return "Non conforme"
-        if h < 8:
-            return "Incomplet"
-        if h == 8:
-            return "Conforme"
-        return "Surpointage"
-
-    daily["Statut"] = daily.apply(
-        lambda r: statut_pointage(r["heures"], r["Jour_semaine"]),
-        axis=1
+    # Règles métier exhaustivité (vectorisées, première condition vraie gagnante)
+    h = daily["heures"].to_numpy()
+    is_weekend = daily["Jour_semaine"].to_numpy() >= 5  # samedi / dimanche
+    daily["Statut"] = np.select(
+        [
+            is_weekend & (h == 0),
+            is_weekend,
+            h == 0,
+            h < 8,
+            h == 8,
+        ],
+        ["Weekend OK", "Travail weekend", "Non conforme", "Incomplet", "Conforme"],
+        default="Surpointage"
     )
 
-    # Pivot sécurisé
-    pivot_statut = daily.pivot_table(
-        index=COL_TECHNICIEN,
-        columns="Jour",
-        values="Statut",
-        aggfunc="first"
-    )
+    # Grille (technicien × jour) construite une seule fois et partagée par les deux pivots
+    # (au plus une ligne par technicien et par jour : remplissage direct, cellules vides = NaN)
+    tech_codes, techniciens = pd.factorize(daily[COL_TECHNICIEN], sort=True)
+    jour_codes, jours = pd.factorize(daily["Jour"], sort=True)
+    index = pd.Index(techniciens, name=COL_TECHNICIEN)
+    columns = pd.Index(jours, name="Jour")
 
-    pivot_heures = daily.pivot_table(
-        index=COL_TECHNICIEN,
-        columns="Jour",
-        values="heures",
-        aggfunc="sum"
-    )
+    statut_mat = np.full((len(index), len(columns)), np.nan, dtype=object)
+    statut_mat[tech_codes, jour_codes] = daily["Statut"].to_numpy()
+    heures_mat = np.full((len(index), len(columns)), np.nan)
+    heures_mat[tech_codes, jour_codes] = daily["heures"].to_numpy()
+
+    pivot_statut = pd.DataFrame(statut_mat, index=index, columns=columns)
+    pivot_heures = pd.DataFrame(heures_mat, index=index, columns=columns)
 
     # Mapping couleurs
     color_map = {
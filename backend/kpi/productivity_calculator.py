@@ -8,10 +8,38 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 import logging
+from utils.ratios import safe_ratio
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Low-cardinality grouping keys, stored as category so groupbys hash integer codes
+CATEGORY_COLUMNS = ['Salarié - Numéro', 'Salarié - Nom', 'Salarié - Equipe(Nom)']
+
+
+def _iso_week_parts(dates: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ISO year, ISO week number and week start (Monday) of each date
+    
+    Same values as dates.dt.isocalendar() year/week and date - weekday, computed
+    with integer day arithmetic instead of building the isocalendar DataFrame.
+    
+    Returns:
+        (iso_year, iso_week, week_start) arrays
+    """
+    values = dates.to_numpy()
+    days = values.astype('datetime64[D]').astype(np.int64)
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    
+    # The ISO year is the calendar year of the week's Thursday
+    thursday = days - weekday + 3
+    iso_year = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+    jan1 = (iso_year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    iso_week = (thursday - jan1) // 7 + 1
+    
+    week_start = values - weekday.astype('timedelta64[D]')
+    return iso_year, iso_week, week_start
+
 
 class ProductivityCalculator:
     """Calculate productivity metrics at various time granularities"""
@@ -23,8 +51,10 @@ class ProductivityCalculator:
         Args:
             df_raw: Raw DataFrame from productivity_loader
         """
-        self.df_raw = df_raw
+        self.df_raw = df_raw.astype({c: 'category' for c in CATEGORY_COLUMNS if c in df_raw.columns})
         self.df_daily = None
+        # Memoized results computed from self.df_daily (treat as read-only)
+        self._cache: Dict[str, pd.DataFrame] = {}
         
     def calculate_productivity_daily(self) -> pd.DataFrame:
         """
@@ -38,6 +68,9 @@ class ProductivityCalculator:
                                    heures_allouees, heures_travaillees, heures_totales,
                                    productivite_pct
         """
+        if 'daily' in self._cache:
+            return self._cache['daily']
+        
         logger.info("Calculating daily productivity...")
         
         # Group by employee + date
@@ -46,7 +79,7 @@ class ProductivityCalculator:
             'Salarié - Nom',
             'Salarié - Equipe(Nom)',
             'Saisie heures - Date'
-        ]).agg({
+        ], observed=True).agg({
             'Facturable': 'sum',
             'Non Facturable': 'sum',
             'Allouée': 'sum',
@@ -62,18 +95,20 @@ class ProductivityCalculator:
         ]
         
         # Calculate productivity percentage
-        df_daily['productivite_pct'] = np.where(
-            df_daily['heures_travaillees'] > 0,
-            (df_daily['heures_facturables'] / df_daily['heures_travaillees']) * 100,
-            0
-        )
-        
-        # Round to 2 decimals
-        df_daily['productivite_pct'] = df_daily['productivite_pct'].round(2)
+        df_daily['productivite_pct'] = (safe_ratio(
+            df_daily['heures_facturables'], df_daily['heures_travaillees'], positive_only=True
+        ) * 100).round(2)  # Round to 2 decimals
         
         logger.info(f"Daily productivity calculated: {len(df_daily)} employee-days")
         
         self.df_daily = df_daily
+        self._cache['daily'] = df_daily
+        return df_daily
+    
+    def _resolve_daily(self, df_daily: pd.DataFrame = None) -> pd.DataFrame:
+        """Return df_daily, or the memoized daily productivity if None"""
+        if df_daily is None:
+            return self.calculate_productivity_daily()
         return df_daily
     
     def calculate_productivity_weekly(self, df_daily: pd.DataFrame = None) -> pd.DataFrame:
@@ -81,23 +116,21 @@ class ProductivityCalculator:
         Calculate weekly productivity per employee
         
         Args:
-            df_daily: Daily productivity DataFrame (uses self.df_daily if None)
+            df_daily: Daily productivity DataFrame (memoized daily result if None)
         
         Returns:
             DataFrame with weekly aggregation
         """
-        if df_daily is None:
-            df_daily = self.df_daily
-        
-        if df_daily is None:
-            raise ValueError("Must run calculate_productivity_daily() first")
+        cache_key = 'weekly' if df_daily is None else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        df_daily = self._resolve_daily(df_daily)
         
         logger.info("Calculating weekly productivity...")
         
-        # Add week information
-        df_daily['annee'] = df_daily['date'].dt.isocalendar().year
-        df_daily['numero_semaine'] = df_daily['date'].dt.isocalendar().week
-        df_daily['semaine_debut'] = df_daily['date'] - pd.to_timedelta(df_daily['date'].dt.weekday, unit='d')
+        # Add week information (on a copy: the daily frame is shared)
+        iso_year, iso_week, week_start = _iso_week_parts(df_daily['date'])
+        df_daily = df_daily.assign(annee=iso_year, numero_semaine=iso_week, semaine_debut=week_start)
         
         # Group by employee + week
         df_weekly = df_daily.groupby([
@@ -107,20 +140,20 @@ class ProductivityCalculator:
             'annee',
             'numero_semaine',
             'semaine_debut'
-        ]).agg({
+        ], observed=True).agg({
             'heures_facturables': 'sum',
             'heures_travaillees': 'sum'
         }).reset_index()
         
         # Calculate weekly productivity
-        df_weekly['productivite_pct'] = np.where(
-            df_weekly['heures_travaillees'] > 0,
-            (df_weekly['heures_facturables'] / df_weekly['heures_travaillees']) * 100,
-            0
-        ).round(2)
+        df_weekly['productivite_pct'] = (safe_ratio(
+            df_weekly['heures_facturables'], df_weekly['heures_travaillees'], positive_only=True
+        ) * 100).round(2)
         
         logger.info(f"Weekly productivity calculated: {len(df_weekly)} employee-weeks")
         
+        if cache_key:
+            self._cache[cache_key] = df_weekly
         return df_weekly
     
     def calculate_productivity_monthly(self, df_daily: pd.DataFrame = None) -> pd.DataFrame:
@@ -128,22 +161,20 @@ class ProductivityCalculator:
         Calculate monthly productivity per employee
         
         Args:
-            df_daily: Daily productivity DataFrame (uses self.df_daily if None)
+            df_daily: Daily productivity DataFrame (memoized daily result if None)
         
         Returns:
             DataFrame with monthly aggregation
         """
-        if df_daily is None:
-            df_daily = self.df_daily
-        
-        if df_daily is None:
-            raise ValueError("Must run calculate_productivity_daily() first")
+        cache_key = 'monthly' if df_daily is None else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        df_daily = self._resolve_daily(df_daily)
         
         logger.info("Calculating monthly productivity...")
         
-        # Add month information
-        df_daily['annee'] = df_daily['date'].dt.year
-        df_daily['mois'] = df_daily['date'].dt.month
+        # Add month information (on a copy: the daily frame is shared)
+        df_daily = df_daily.assign(annee=df_daily['date'].dt.year, mois=df_daily['date'].dt.month)
         
         # Group by employee + month
         df_monthly = df_daily.groupby([
@@ -152,20 +183,20 @@ class ProductivityCalculator:
             'equipe',
             'annee',
             'mois'
-        ]).agg({
+        ], observed=True).agg({
             'heures_facturables': 'sum',
             'heures_travaillees': 'sum'
         }).reset_index()
         
         # Calculate monthly productivity
-        df_monthly['productivite_pct'] = np.where(
-            df_monthly['heures_travaillees'] > 0,
-            (df_monthly['heures_facturables'] / df_monthly['heures_travaillees']) * 100,
-            0
-        ).round(2)
+        df_monthly['productivite_pct'] = (safe_ratio(
+            df_monthly['heures_facturables'], df_monthly['heures_travaillees'], positive_only=True
+        ) * 100).round(2)
         
         logger.info(f"Monthly productivity calculated: {len(df_monthly)} employee-months")
         
+        if cache_key:
+            self._cache[cache_key] = df_monthly
         return df_monthly
     
     def calculate_productivity_rolling12(self, df_daily: pd.DataFrame = None) -> pd.DataFrame:
@@ -173,61 +204,68 @@ class ProductivityCalculator:
         Calculate rolling 12-month productivity per employee (for SEP)
         
         Args:
-            df_daily: Daily productivity DataFrame (uses self.df_daily if None)
+            df_daily: Daily productivity DataFrame (memoized daily result if None)
         
         Returns:
             DataFrame with rolling 12-month productivity
         """
-        if df_daily is None:
-            df_daily = self.df_daily
-        
-        if df_daily is None:
-            raise ValueError("Must run calculate_productivity_daily() first")
+        cache_key = 'rolling12' if df_daily is None else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        df_daily = self._resolve_daily(df_daily)
         
         logger.info("Calculating rolling 12-month productivity...")
         
         # Get unique employees
         employees = df_daily[['salarie_id', 'salarie_nom', 'equipe']].drop_duplicates()
         
-        # Get all dates
-        all_dates = df_daily['date'].unique()
-        all_dates.sort()
-        
-        rolling_results = []
-        
-        for _, emp in employees.iterrows():
-            emp_data = df_daily[df_daily['salarie_id'] == emp['salarie_id']].copy()
-            emp_data = emp_data.sort_values('date')
+        # Reference dates (sorted) and, for each, the rank of its 12-month window start
+        all_dates = pd.DatetimeIndex(np.sort(df_daily['date'].unique()))
+        n_dates = len(all_dates)
+        if n_dates == 0:
+            # No daily data: empty result, no grid to build
+            df_rolling12 = pd.DataFrame()
+            logger.info("Rolling 12-month productivity calculated: 0 records")
+            if cache_key:
+                self._cache[cache_key] = df_rolling12
+            return df_rolling12
+        
+        start_ranks = all_dates.searchsorted(all_dates - pd.DateOffset(months=12), side='left')
+        
+        # Scatter hours onto a dense (employee x reference date) grid; days without data count as 0
+        emp_codes, emp_uniques = pd.factorize(df_daily['salarie_id'])
+        n_cells = len(emp_uniques) * n_dates
+        cells = emp_codes * n_dates + all_dates.searchsorted(df_daily['date'])
+        
+        def window_sums(weights=None):
+            # Running sum along dates (leading 0 column), then a fixed slide over precomputed window starts
+            grid = np.bincount(cells, weights, minlength=n_cells).reshape(-1, n_dates)
+            cum = np.concatenate([np.zeros((len(grid), 1)), grid.cumsum(axis=1)], axis=1)
+            return cum[:, 1:] - cum[:, start_ranks]
+        
+        # One value per (employee, reference date), in employees order
+        grid_rows = pd.Index(emp_uniques).get_indexer(employees['salarie_id'])
+        has_data = window_sums()[grid_rows].ravel() > 0
+        
+        if has_data.any():
+            heures_fact_r12 = window_sums(df_daily['heures_facturables'].to_numpy(dtype=float))[grid_rows].ravel()[has_data]
+            heures_trav_r12 = window_sums(df_daily['heures_travaillees'].to_numpy(dtype=float))[grid_rows].ravel()[has_data]
+            prod_r12 = safe_ratio(heures_fact_r12, heures_trav_r12, positive_only=True) * 100
             
-            # For each date, calculate rolling 12 months
-            for date in all_dates:
-                # Get data from (date - 12 months) to date
-                start_date = date - pd.DateOffset(months=12)
-                mask = (emp_data['date'] >= start_date) & (emp_data['date'] <= date)
-                period_data = emp_data[mask]
-                
-                if len(period_data) > 0:
-                    heures_fact_r12 = period_data['heures_facturables'].sum()
-                    heures_trav_r12 = period_data['heures_travaillees'].sum()
-                    
-                    prod_r12 = 0
-                    if heures_trav_r12 > 0:
-                        prod_r12 = (heures_fact_r12 / heures_trav_r12) * 100
-                    
-                    rolling_results.append({
-                        'salarie_id': emp['salarie_id'],
-                        'salarie_nom': emp['salarie_nom'],
-                        'equipe': emp['equipe'],
-                        'date_reference': date,
-                        'heures_facturables_r12': heures_fact_r12,
-                        'heures_travaillees_r12': heures_trav_r12,
-                        'productivite_r12_pct': round(prod_r12, 2)
-                    })
-        
-        df_rolling12 = pd.DataFrame(rolling_results)
+            # Employee columns: repeat each employee row once per reference date (keeps dtypes)
+            emp_rows = np.repeat(np.arange(len(employees)), n_dates)[has_data]
+            df_rolling12 = employees.iloc[emp_rows].reset_index(drop=True)
+            df_rolling12['date_reference'] = np.tile(all_dates.to_numpy(), len(employees))[has_data]
+            df_rolling12['heures_facturables_r12'] = heures_fact_r12
+            df_rolling12['heures_travaillees_r12'] = heures_trav_r12
+            df_rolling12['productivite_r12_pct'] = prod_r12.round(2)
+        else:
+            df_rolling12 = pd.DataFrame()
         
         logger.info(f"Rolling 12-month productivity calculated: {len(df_rolling12)} records")
         
+        if cache_key:
+            self._cache[cache_key] = df_rolling12
         return df_rolling12
     
     def calculate_team_productivity(self, df_daily: pd.DataFrame = None, 
@@ -236,33 +274,32 @@ class ProductivityCalculator:
         Calculate productivity by team (aggregated across all employees)
         
         Args:
-            df_daily: Daily productivity DataFrame
+            df_daily: Daily productivity DataFrame (memoized daily result if None)
             period: 'daily', 'weekly', or 'monthly'
         
         Returns:
             DataFrame with team-level productivity
         """
-        if df_daily is None:
-            df_daily = self.df_daily
-        
-        if df_daily is None:
-            raise ValueError("Must run calculate_productivity_daily() first")
+        cache_key = f'team_{period}' if df_daily is None else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        df_daily = self._resolve_daily(df_daily)
         
         logger.info(f"Calculating {period} team productivity...")
         
+        # Period columns are added on a copy: the daily frame is shared
         if period == 'monthly':
-            df_daily['annee'] = df_daily['date'].dt.year
-            df_daily['mois'] = df_daily['date'].dt.month
+            df_daily = df_daily.assign(annee=df_daily['date'].dt.year, mois=df_daily['date'].dt.month)
             group_cols = ['equipe', 'annee', 'mois']
         elif period == 'weekly':
-            df_daily['annee'] = df_daily['date'].dt.isocalendar().year
-            df_daily['numero_semaine'] = df_daily['date'].dt.isocalendar().week
+            iso_year, iso_week, _ = _iso_week_parts(df_daily['date'])
+            df_daily = df_daily.assign(annee=iso_year, numero_semaine=iso_week)
             group_cols = ['equipe', 'annee', 'numero_semaine']
         else:  # daily
             group_cols = ['equipe', 'date']
         
         # Aggregate by team
-        df_team = df_daily.groupby(group_cols).agg({
+        df_team = df_daily.groupby(group_cols, observed=True).agg({
             'heures_facturables': 'sum',
             'heures_travaillees': 'sum',
             'salarie_id': 'nunique'  # Count unique employees
@@ -271,14 +308,14 @@ class ProductivityCalculator:
         df_team.rename(columns={'salarie_id': 'nb_salaries'}, inplace=True)
         
         # Calculate team productivity
-        df_team['productivite_pct'] = np.where(
-            df_team['heures_travaillees'] > 0,
-            (df_team['heures_facturables'] / df_team['heures_travaillees']) * 100,
-            0
-        ).round(2)
+        df_team['productivite_pct'] = (safe_ratio(
+            df_team['heures_facturables'], df_team['heures_travaillees'], positive_only=True
+        ) * 100).round(2)
         
         logger.info(f"Team productivity calculated: {len(df_team)} team-periods")
         
+        if cache_key:
+            self._cache[cache_key] = df_team
         return df_team
 
 
@@ -314,5 +351,5 @@ if __name__ == "__main__":
     print("\n=== TEAM PRODUCTIVITY (Sample) ===")
     print(df_team.head(10))
     print(f"\nTeam productivity by equipe:")
-    team_avg = df_team.groupby('equipe')['productivite_pct'].mean().sort_values(ascending=False)
+    team_avg = df_team.groupby('equipe', observed=True)['productivite_pct'].mean().sort_values(ascending=False)
     print(team_avg)
@@ -2,6 +2,7 @@
 Data Loader for Productivity KPI
 Loads and validates timesheet data from Excel file
 """
+import importlib.util
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -11,6 +12,13 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rust-based calamine reader when python-calamine is installed (much faster and lighter
+# than openpyxl on large workbooks); None falls back to the pandas default engine
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Hour columns, parsed as float64 while reading (no object column to coerce afterwards)
+NUMERIC_COLUMNS = ['Facturable', 'Non Facturable', 'Allouée', 'Hr_travaillée', 'Hr_Totale']
+
 class ProductivityDataLoader:
     """Load and validate productivity timesheet data"""
     
@@ -39,7 +47,11 @@ class ProductivityDataLoader:
         if not self.file_path.exists():
             raise FileNotFoundError(f"File not found: {self.file_path}")
         
-        self.df_raw = pd.read_excel(self.file_path)
+        self.df_raw = pd.read_excel(
+            self.file_path,
+            engine=EXCEL_ENGINE,
+            dtype={col: 'float64' for col in NUMERIC_COLUMNS}
+        )
         logger.info(f"Loaded {len(self.df_raw)} rows, {len(self.df_raw.columns)} columns")
         
         return self.df_raw
@@ -73,17 +85,12 @@ class ProductivityDataLoader:
     def clean_data(self) -> pd.DataFrame:
         """Clean and standardize data"""
         logger.info("Cleaning data...")
-        df = self.df_raw.copy()
+        # Fill NaN values in numeric columns with 0 (single pass; returns a new frame)
+        df = self.df_raw.fillna({col: 0 for col in NUMERIC_COLUMNS if col in self.df_raw.columns})
         
-        # Convert date column to datetime
+        # Convert date column to datetime (no-op when Excel already stored real dates)
         df['Saisie heures - Date'] = pd.to_datetime(df['Saisie heures - Date'])
         
-        # Fill NaN values in numeric columns with 0
-        numeric_cols = ['Facturable', 'Non Facturable', 'Allouée', 'Hr_travaillée', 'Hr_Totale']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna(0)
-        
         # Ensure OR number is integer
         df['OR (Numéro)'] = df['OR (Numéro)'].fillna(0).astype(int)
         
@@ -98,20 +105,26 @@ class ProductivityDataLoader:
     
     def get_data_summary(self, df: pd.DataFrame) -> Dict:
         """Get summary statistics of the data"""
+        # One pass per column: date bounds, team list and non-null counts are each computed once
+        date_start = df['Saisie heures - Date'].min()
+        date_end = df['Saisie heures - Date'].max()
+        teams = df['Salarié - Equipe(Nom)'].unique()
+        counts = df[['Facturable', 'Non Facturable', 'Allouée']].count()
+        
         summary = {
             'total_rows': len(df),
             'total_employees': df['Salarié - Numéro'].nunique(),
-            'total_teams': df['Salarié - Equipe(Nom)'].nunique(),
+            'total_teams': int(pd.notna(teams).sum()),
             'date_range': {
-                'start': df['Saisie heures - Date'].min(),
-                'end': df['Saisie heures - Date'].max(),
-                'days': (df['Saisie heures - Date'].max() - df['Saisie heures - Date'].min()).days
+                'start': date_start,
+                'end': date_end,
+                'days': (date_end - date_start).days
             },
-            'teams': df['Salarié - Equipe(Nom)'].unique().tolist(),
+            'teams': teams.tolist(),
             'categories': {
-                'facturable': df['Facturable'].notna().sum(),
-                'non_facturable': df['Non Facturable'].notna().sum(),
-                'allouee': df['Allouée'].notna().sum()
+                'facturable': counts['Facturable'],
+                'non_facturable': counts['Non Facturable'],
+                'allouee': counts['Allouée']
             }
         }
         
@@ -5,7 +5,7 @@ Based on productivity_kpi_methodology.md
 
 # SQL Schema for PostgreSQL/SQLite
 
-SCHEMA_SQL = """
+TABLES_SQL = """
 -- Table 1: Raw timesheet data (imported from Excel)
 CREATE TABLE IF NOT EXISTS pointages_raw (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,11 +24,6 @@ CREATE TABLE IF NOT EXISTS pointages_raw (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX IF NOT EXISTS idx_pointages_raw_salarie ON pointages_raw(salarie_numero);
-CREATE INDEX IF NOT EXISTS idx_pointages_raw_date ON pointages_raw(saisie_date);
-CREATE INDEX IF NOT EXISTS idx_pointages_raw_equipe ON pointages_raw(salarie_equipe_nom);
-CREATE INDEX IF NOT EXISTS idx_pointages_raw_or ON pointages_raw(or_numero);
-
 -- Table 2: Daily aggregation (salarie + date)
 CREATE TABLE IF NOT EXISTS pointages_daily (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,10 +41,6 @@ CREATE TABLE IF NOT EXISTS pointages_daily (
     UNIQUE(salarie_id, date)
 );
 
-CREATE INDEX IF NOT EXISTS idx_daily_salarie ON pointages_daily(salarie_id);
-CREATE INDEX IF NOT EXISTS idx_daily_date ON pointages_daily(date);
-CREATE INDEX IF NOT EXISTS idx_daily_equipe ON pointages_daily(equipe);
-
 -- Table 3: Exhaustivity control (daily status)
 CREATE TABLE IF NOT EXISTS exhaustivite_daily (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,9 +56,6 @@ CREATE TABLE IF NOT EXISTS exhaustivite_daily (
     UNIQUE(salarie_id, date)
 );
 
-CREATE INDEX IF NOT EXISTS idx_exhaustivite_date ON exhaustivite_daily(date);
-CREATE INDEX IF NOT EXISTS idx_exhaustivite_statut ON exhaustivite_daily(statut_exhaustivite);
-
 -- Table 4: Weekly productivity aggregation
 CREATE TABLE IF NOT EXISTS productivite_weekly (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -84,9 +72,6 @@ CREATE TABLE IF NOT EXISTS productivite_weekly (
     UNIQUE(salarie_id, annee, numero_semaine)
 );
 
-CREATE INDEX IF NOT EXISTS idx_weekly_salarie ON productivite_weekly(salarie_id);
-CREATE INDEX IF NOT EXISTS idx_weekly_period ON productivite_weekly(annee, numero_semaine);
-
 -- Table 5: Monthly productivity aggregation
 CREATE TABLE IF NOT EXISTS productivite_monthly (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -102,10 +87,6 @@ CREATE TABLE IF NOT EXISTS productivite_monthly (
     UNIQUE(salarie_id, annee, mois)
 );
 
-CREATE INDEX IF NOT EXISTS idx_monthly_salarie ON productivite_monthly(salarie_id);
-CREATE INDEX IF NOT EXISTS idx_monthly_period ON productivite_monthly(annee, mois);
-CREATE INDEX IF NOT EXISTS idx_monthly_equipe ON productivite_monthly(equipe);
-
 -- Table 6: Rolling 12-month productivity (for SEP)
 CREATE TABLE IF NOT EXISTS productivite_rolling12 (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -120,9 +101,6 @@ CREATE TABLE IF NOT EXISTS productivite_rolling12 (
     UNIQUE(salarie_id, date_reference)
 );
 
-CREATE INDEX IF NOT EXISTS idx_rolling12_salarie ON productivite_rolling12(salarie_id);
-CREATE INDEX IF NOT EXISTS idx_rolling12_date ON productivite_rolling12(date_reference);
-
 -- Table 7: Exhaustivity summary by team/month
 CREATE TABLE IF NOT EXISTS exhaustivite_summary (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -140,13 +118,33 @@ CREATE TABLE IF NOT EXISTS exhaustivite_summary (
     UNIQUE(equipe, annee, mois)
 );
 
-CREATE INDEX IF NOT EXISTS idx_summary_equipe ON exhaustivite_summary(equipe);
-CREATE INDEX IF NOT EXISTS idx_summary_period ON exhaustivite_summary(annee, mois);
 """
 
+# Secondary indexes, one statement each (created after the tables).
+# Indexes on salarie_id alone are omitted: it is the leading column of each table's
+# UNIQUE(salarie_id, ...) constraint, whose index already serves those lookups.
+INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_pointages_raw_salarie ON pointages_raw(salarie_numero)",
+    "CREATE INDEX IF NOT EXISTS idx_pointages_raw_date ON pointages_raw(saisie_date)",
+    "CREATE INDEX IF NOT EXISTS idx_pointages_raw_equipe ON pointages_raw(salarie_equipe_nom)",
+    "CREATE INDEX IF NOT EXISTS idx_pointages_raw_or ON pointages_raw(or_numero)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_date ON pointages_daily(date)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_equipe ON pointages_daily(equipe)",
+    "CREATE INDEX IF NOT EXISTS idx_exhaustivite_date ON exhaustivite_daily(date)",
+    "CREATE INDEX IF NOT EXISTS idx_exhaustivite_statut ON exhaustivite_daily(statut_exhaustivite)",
+    "CREATE INDEX IF NOT EXISTS idx_weekly_period ON productivite_weekly(annee, numero_semaine)",
+    "CREATE INDEX IF NOT EXISTS idx_monthly_period ON productivite_monthly(annee, mois)",
+    "CREATE INDEX IF NOT EXISTS idx_monthly_equipe ON productivite_monthly(equipe)",
+    "CREATE INDEX IF NOT EXISTS idx_rolling12_date ON productivite_rolling12(date_reference)",
+    "CREATE INDEX IF NOT EXISTS idx_summary_equipe ON exhaustivite_summary(equipe)",
+    "CREATE INDEX IF NOT EXISTS idx_summary_period ON exhaustivite_summary(annee, mois)",
+]
+
+SCHEMA_SQL = TABLES_SQL + "\n".join(f"{stmt};" for stmt in INDEXES_SQL) + "\n"
+
 # Helper function to create tables
 def create_tables(conn):
-    """Create all productivity KPI tables"""
+    """Create all productivity KPI tables and indexes (one executescript)"""
     cursor = conn.cursor()
     cursor.executescript(SCHEMA_SQL)
     conn.commit()
@@ -1,8 +1,12 @@
 """Point d'entrée principal de l'application FastAPI - Version refactorisée"""
-from fastapi import FastAPI, Request, HTTPException
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
+
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from config import ADMIN_EMAIL, ADMIN_PASSWORD, EXEMPT_PATHS, ALLOWED_ADMINS
-from database import ensure_schema
+from database import ensure_schema, open_pool, close_pool
 from routes import inspection, upload, lean_actions, meeting_summary, llti, productivity_kpi
 # from routes import productivity_old  # Disabled - legacy routes with incompatible imports
 
@@ -20,29 +24,41 @@ app.add_middleware(
 )
 
 # ==================================================
-# MIDDLEWARE AUTH
+# AUTH
 # ==================================================
-@app.middleware("http")
-async def email_guard(request: Request, call_next):
-    if request.method == "OPTIONS":
-        return await call_next(request)
+@lru_cache(maxsize=1024)
+def _classify_email(raw_email: str) -> Mapping[str, str] | None:
+    """Normalise l'email et détermine le rôle, une fois par valeur d'en-tête (peu d'utilisateurs distincts)
 
-    if request.url.path in EXEMPT_PATHS:
-        return await call_next(request)
+    Le résultat est partagé entre requêtes, d'où la vue en lecture seule.
+    """
+    email = raw_email.strip().lower()
+    if not email or not email.endswith("@neemba.com"):
+        return None
+    role = "admin" if ADMIN_EMAIL and email == ADMIN_EMAIL else "guest"
+    return MappingProxyType({"email": email, "role": role})
 
-    raw_email = request.headers.get("x-user-email") or request.headers.get("X-User-Email")
-    email = (raw_email or "").strip().lower()
 
-    if not email or not email.endswith("@neemba.com"):
+async def require_neemba_user(request: Request) -> None:
+    """Authentification par en-tête X-User-Email, déclarée sur les routes protégées uniquement
+
+    async : exécutée dans la boucle d'événements, sans passage par le threadpool.
+    """
+    if request.url.path in EXEMPT_PATHS:
+        return
+
+    # Les en-têtes Starlette sont insensibles à la casse : une seule recherche suffit
+    user = _classify_email(request.headers.get("x-user-email") or "")
+    if user is None:
         raise HTTPException(
             status_code=401,
             detail="Email non autorisé (domaine @neemba.com requis)",
         )
 
-    role = "admin" if ADMIN_EMAIL and email == ADMIN_EMAIL else "guest"
-    request.state.user = {"email": email, "role": role}
+    request.state.user = user
 
-    return await call_next(request)
+
+AUTH = [Depends(require_neemba_user)]
 
 
 # ==================================================
@@ -50,9 +66,15 @@ async def email_guard(request: Request, call_next):
 # ==================================================
 @app.on_event("startup")
 def _startup():
+    open_pool()
     ensure_schema()
 
 
+@app.on_event("shutdown")
+def _shutdown():
+    close_pool()
+
+
 # ==================================================
 # HEALTH
 # ==================================================
@@ -65,32 +87,32 @@ async def health():
 # ROUTES
 # ==================================================
 # app.include_router(productivity_old.router)  # Disabled - legacy routes
-app.include_router(productivity_kpi.router)  # New Productivity KPI endpoints
-app.include_router(inspection.router)
-app.include_router(llti.router)
-app.include_router(upload.router)
-app.include_router(lean_actions.router)
-app.include_router(meeting_summary.router)
+app.include_router(productivity_kpi.router, dependencies=AUTH)  # New Productivity KPI endpoints
+app.include_router(inspection.router, dependencies=AUTH)
+app.include_router(llti.router, dependencies=AUTH)
+app.include_router(upload.router, dependencies=AUTH)
+app.include_router(lean_actions.router, dependencies=AUTH)
+app.include_router(meeting_summary.router, dependencies=AUTH)
 
 from agents.mock_agent import MockAgentService
-@app.get("/api/analyze/mock", tags=["Analysis"])
+@app.get("/api/analyze/mock", tags=["Analysis"], dependencies=AUTH)
 def get_mock_analysis():
     return MockAgentService.get_analysis()
 
 # SEP Digital Twin Endpoints
-@app.get("/api/sep/kpis", tags=["SEP"])
+@app.get("/api/sep/kpis", tags=["SEP"], dependencies=AUTH)
 def get_sep_kpis():
     """Get all SEP KPIs (12 official metrics)"""
     from services.mock_sep_data import MockSEPDataService
     return MockSEPDataService.get_sep_kpis()
 
-@app.get("/api/sep/custom-kpis", tags=["SEP"])
+@app.get("/api/sep/custom-kpis", tags=["SEP"], dependencies=AUTH)
 def get_custom_kpis():
     """Get custom internal KPIs"""
     from services.mock_sep_data import MockSEPDataService
     return MockSEPDataService.get_custom_kpis()
 
-@app.get("/api/sep/insights", tags=["SEP"])
+@app.get("/api/sep/insights", tags=["SEP"], dependencies=AUTH)
 def get_agent_insights():
     """Get agent insights and recommendations"""
     from services.mock_sep_data import MockSEPDataService
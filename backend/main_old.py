@@ -1,19 +1,26 @@
+import hashlib
+import importlib.util
 import os
+import re
 from io import BytesIO
 from pathlib import Path
-from datetime import datetime, date
-from typing import Any, Dict, List
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping
 
+import numpy as np
 import pandas as pd
 from fastapi import FastAPI, File, HTTPException, Request, UploadFile, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-import psycopg
+from fastapi.responses import JSONResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from database import TABLE_GENERATION_SCHEMA, close_pool, copy_upsert, get_conn, open_pool, read_sql_copy
+from utils.ratios import safe_ratio
 
 
 # ==================================================
@@ -22,7 +29,8 @@ from reportlab.lib.units import inch
 ADMIN_EMAIL = (os.environ.get("ADMIN_EMAIL") or "").strip().lower()
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD") or ""
 ENV = os.environ.get("ENV", "dev")
-DATABASE_URL = os.environ.get("DATABASE_URL") or "postgresql://kpi_user:kpi_pass@db:5432/kpi_db"
+# Lecteur Excel calamine (Rust) si python-calamine est installé, sinon moteur pandas par défaut
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
 
 EXEMPT_PATHS = {
     "/health",
@@ -123,31 +131,54 @@ ALLOWED_ADMINS = [
 ALLOWED_ADMINS = [e for e in ALLOWED_ADMINS if e]  # Filtrer les valeurs vides
 
 
-def get_conn():
-    try:
-        return psycopg.connect(DATABASE_URL)
-    except Exception as exc:  # pragma: no cover
-        raise HTTPException(status_code=500, detail=f"DB connection failed: {exc}") from exc
+# DDL complet envoyé en un seul aller-retour, rejoué seulement si son empreinte
+# (commentaire de la table pointage) a changé
+SCHEMA_DDL = "\n".join([POINTAGE_SCHEMA, LEAN_ACTION_SCHEMA, MEETING_SUMMARY_SCHEMA, INSPECTION_RECORD_SCHEMA, TABLE_GENERATION_SCHEMA])
+SCHEMA_VERSION = "schema:" + hashlib.sha256(SCHEMA_DDL.encode()).hexdigest()[:16]
+_schema_ready = False
 
 
 def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(POINTAGE_SCHEMA)
-            cur.execute(LEAN_ACTION_SCHEMA)
-            cur.execute(MEETING_SUMMARY_SCHEMA)
-            cur.execute(INSPECTION_RECORD_SCHEMA)
+            cur.execute("SELECT obj_description(to_regclass('pointage'), 'pg_class')")
+            if cur.fetchone()[0] != SCHEMA_VERSION:
+                cur.execute(SCHEMA_DDL)
+                cur.execute(f"COMMENT ON TABLE pointage IS '{SCHEMA_VERSION}'")
         conn.commit()
+    _schema_ready = True
 
 
 @app.on_event("startup")
 def _startup():
+    open_pool()
     ensure_schema()
 
 
+@app.on_event("shutdown")
+def _shutdown():
+    close_pool()
+
+
 # ==================================================
 # MIDDLEWARE AUTH
 # ==================================================
+@lru_cache(maxsize=1024)
+def _classify_email(raw_email: str) -> Mapping[str, str] | None:
+    """Normalise l'email et détermine le rôle, une fois par valeur d'en-tête (peu d'utilisateurs distincts)
+
+    Le résultat est partagé entre requêtes, d'où la vue en lecture seule.
+    """
+    email = raw_email.strip().lower()
+    if not email or not email.endswith("@neemba.com"):
+        return None
+    role = "admin" if ADMIN_EMAIL and email == ADMIN_EMAIL else "guest"
+    return MappingProxyType({"email": email, "role": role})
+
+
 @app.middleware("http")
 async def email_guard(request: Request, call_next):
     if request.method == "OPTIONS":
@@ -156,17 +187,15 @@ async def email_guard(request: Request, call_next):
     if request.url.path in EXEMPT_PATHS:
         return await call_next(request)
 
-    raw_email = request.headers.get("x-user-email") or request.headers.get("X-User-Email")
-    email = (raw_email or "").strip().lower()
-
-    if not email or not email.endswith("@neemba.com"):
+    # Les en-têtes Starlette sont insensibles à la casse : une seule recherche suffit
+    user = _classify_email(request.headers.get("x-user-email") or "")
+    if user is None:
         raise HTTPException(
             status_code=401,
             detail="Email non autorisé (domaine @neemba.com requis)",
         )
 
-    role = "admin" if ADMIN_EMAIL and email == ADMIN_EMAIL else "guest"
-    request.state.user = {"email": email, "role": role}
+    request.state.user = user
 
     return await call_next(request)
 
@@ -182,59 +211,21 @@ async def health():
 # ==================================================
 # UTILITAIRES TRIMESTRE
 # ==================================================
+# Trimestre -> (premier mois, dernier mois)
+_QUARTER_MONTHS = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+
+
 def get_current_quarter_dates() -> tuple[date, date]:
     """Retourne la date de début et de fin du trimestre actuel."""
     today = date.today()
-    year = today.year
-    month = today.month
-    
-    # Déterminer le trimestre
-    if month in [1, 2, 3]:
-        quarter = 1
-        start_month = 1
-        end_month = 3
-    elif month in [4, 5, 6]:
-        quarter = 2
-        start_month = 4
-        end_month = 6
-    elif month in [7, 8, 9]:
-        quarter = 3
-        start_month = 7
-        end_month = 9
-    else:  # 10, 11, 12
-        quarter = 4
-        start_month = 10
-        end_month = 12
-    
-    start_date = date(year, start_month, 1)
-    
-    # Date de fin = dernier jour du dernier mois du trimestre
-    if end_month == 12:
-        end_date = date(year, 12, 31)
-    else:
-        # Premier jour du mois suivant - 1 jour
-        next_month = end_month + 1
-        end_date = date(year, next_month, 1) - pd.Timedelta(days=1)
-    
-    return start_date, end_date
+    return get_quarter_dates(today.year, (today.month - 1) // 3 + 1)
 
 
 def get_quarter_dates(year: int, quarter: int) -> tuple[date, date]:
     """Retourne la date de début et de fin d'un trimestre spécifique."""
-    if quarter == 1:
-        start_month = 1
-        end_month = 3
-    elif quarter == 2:
-        start_month = 4
-        end_month = 6
-    elif quarter == 3:
-        start_month = 7
-        end_month = 9
-    elif quarter == 4:
-        start_month = 10
-        end_month = 12
-    else:
+    if quarter not in _QUARTER_MONTHS:
         raise ValueError(f"Trimestre invalide: {quarter}. Doit être entre 1 et 4.")
+    start_month, end_month = _QUARTER_MONTHS[quarter]
     
     start_date = date(year, start_month, 1)
     
@@ -242,8 +233,8 @@ def get_quarter_dates(year: int, quarter: int) -> tuple[date, date]:
     if end_month == 12:
         end_date = date(year, 12, 31)
     else:
-        next_month = end_month + 1
-        end_date = date(year, next_month, 1) - pd.Timedelta(days=1)
+        # Premier jour du mois suivant - 1 jour
+        end_date = date(year, end_month + 1, 1) - timedelta(days=1)
     
     return start_date, end_date
 
@@ -251,17 +242,24 @@ def get_quarter_dates(year: int, quarter: int) -> tuple[date, date]:
 # ==================================================
 # DATA PREPARATION
 # ==================================================
+# Toujours regrouper ces colonnes avec observed=True (sinon catégories absentes => groupes vides)
+PRODUCTIVITY_CATEGORY_COLUMNS = ["Salarié - Nom", "Salarié - Equipe(Nom)", "mois", "mois_period"]
+
+# Abréviations de mois (équivalent de strftime("%b") en locale C), indexées par numéro de mois
+MONTH_ABBR = np.array(["", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], dtype=object)
+
+
 def _prepare_productivity_df(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
-    df = df.copy()
+    # Modifié en place : les deux appelants (upload, _prepared_from_db) passent un DataFrame jetable
 
     # Date
     df["Saisie heures - Date"] = pd.to_datetime(
         df["Saisie heures - Date"], errors="coerce"
     )
-    df = df.dropna(subset=["Saisie heures - Date"])
+    df.dropna(subset=["Saisie heures - Date"], inplace=True)
 
     # Normalisation heures - uniquement Hr_Totale
     if "Hr_Totale" not in df.columns:
@@ -283,37 +281,103 @@ def _prepare_productivity_df(df: pd.DataFrame) -> pd.DataFrame:
         .fillna(0)
     )
 
-    # Features temporelles
-    df["jour"] = df["Saisie heures - Date"].dt.day
-    df["weekday"] = df["Saisie heures - Date"].dt.weekday
-    df["mois"] = df["Saisie heures - Date"].dt.strftime("%b")
-    df["month_num"] = df["Saisie heures - Date"].dt.month
-    df["mois_period"] = df["Saisie heures - Date"].dt.to_period("M").astype(str)
+    # Features temporelles : une seule conversion en jours, le reste en arithmétique entière
+    days = df["Saisie heures - Date"].to_numpy(dtype="datetime64[D]")
+    months = days.astype("datetime64[M]")
+    month_num = (months.astype(np.int64) % 12 + 1).astype(np.int32)
+    df["jour"] = ((days - months).astype(np.int64) + 1).astype(np.int32)
+    df["weekday"] = ((days.astype(np.int64) + 3) % 7).astype(np.int32)  # 1970-01-01 était un jeudi
+    df["mois"] = MONTH_ABBR[month_num]
+    df["month_num"] = month_num
+    # "YYYY-MM" formaté une fois par mois distinct, pas par ligne
+    period_values, period_codes = np.unique(months, return_inverse=True)
+    df["mois_period"] = pd.Categorical.from_codes(period_codes, np.datetime_as_string(period_values, unit="M"))
 
     # KPI
-    df["productivite"] = (
-        df["Facturable"] / df["heures_travaillees"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    df["productivite"] = safe_ratio(df["Facturable"], df["heures_travaillees"], positive_only=False)
+
+    # Clés de regroupement à faible cardinalité : category (groupby sur codes entiers, mémoire réduite)
+    df = df.astype({col: "category" for col in PRODUCTIVITY_CATEGORY_COLUMNS})
 
     return df
 
 
+# Colonnes texte à faible cardinalité des inspections : category (groupby sur codes entiers)
+INSPECTION_CATEGORY_COLUMNS = ["or_segment", "type_materiel", "atelier", "technicien", "equipe"]
+
+
+@lru_cache(maxsize=16)
+def _inspection_from_db(signature: tuple, start_date: date | None, end_date: date | None) -> pd.DataFrame:
+    """Lignes d'inspection d'une période pour un état donné de la table (partagé entre requêtes : lecture seule)"""
+    query = "SELECT sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe FROM inspection_record"
+    params = []
+    if start_date and end_date:
+        query += " WHERE date_facture >= %s AND date_facture <= %s"
+        params = [start_date, end_date]
+    query += " ORDER BY date_facture DESC"
+    
+    df = read_sql_copy(
+        query,
+        params if params else None,
+        text_columns=["sn", "or_segment", "type_materiel", "atelier", "is_inspected", "technicien", "equipe"],
+    )
+    return df.astype({col: "category" for col in INSPECTION_CATEGORY_COLUMNS})
+
+
 def _load_inspection_from_db(start_date: date | None = None, end_date: date | None = None) -> pd.DataFrame | None:
-    """Charge les données d'inspection depuis la base de données"""
-    try:
-        with get_conn() as conn:
-            query = "SELECT sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe FROM inspection_record"
-            params = []
-            if start_date and end_date:
-                query += " WHERE date_facture >= %s AND date_facture <= %s"
-                params = [start_date, end_date]
-            query += " ORDER BY date_facture DESC"
-            
-            df = pd.read_sql_query(query, conn, params=params if params else None)
-            return df if not df.empty else None
-    except Exception as exc:
-        print(f"⚠️ Erreur chargement inspection depuis DB: {exc}")
-        return None
+    """Charge les données d'inspection depuis la base de données (mises en cache tant que la table ne change pas)
+
+    Les erreurs de base sont propagées (à ne pas confondre avec une période sans données).
+    """
+    df = _inspection_from_db(_table_signature("inspection_record"), start_date, end_date)
+    return df if not df.empty else None
+
+
+def _or_inspection_counts(start_date: date, end_date: date) -> tuple[int, int]:
+    """(OR uniques, OR avec au moins une ligne "Inspecté") d'une période, calculés par la base
+
+    Même filtre que côté pandas : or_segment renseigné et non blanc. Les erreurs de base sont propagées.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT count(DISTINCT or_segment),
+                       count(DISTINCT or_segment) FILTER (WHERE is_inspected = 'Inspecté')
+                FROM inspection_record
+                WHERE date_facture >= %s AND date_facture <= %s
+                  AND or_segment ~ '\\S'
+                """,
+                (start_date, end_date),
+            )
+            total_or, inspected_or = cur.fetchone()
+            return total_or, inspected_or
+
+
+def _or_inspected(df: pd.DataFrame, keys: list[str]) -> pd.Series:
+    """Statut d'inspection par OR (True si au moins une ligne est "Inspecté"), indexé par `keys`
+
+    Comparaison vectorisée puis max par groupe : pas de lambda Python appelée pour chaque groupe.
+    """
+    inspected = df["is_inspected"].eq("Inspecté")
+    return inspected.groupby([df[k] for k in keys], observed=True).max()
+
+
+def _to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Équivalent de to_dict(orient="records") construit colonne par colonne
+
+    tolist() convertit chaque colonne en types Python natifs en une passe ; les dicts sont ensuite assemblés par zip.
+    """
+    columns = df.columns.tolist()
+    return [dict(zip(columns, row)) for row in zip(*(_column_values(df[col]) for col in columns))]
+
+
+def _column_values(s: pd.Series) -> list:
+    """Valeurs Python d'une colonne ; pour une category, None pour les manquants (comme la colonne texte d'origine)"""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        values = s.cat.categories.tolist() + [None]  # code -1 (manquant) -> dernier élément
+        return [values[code] for code in s.cat.codes.tolist()]
+    return s.tolist()
 
 
 def _calculate_inspection_analytics(start_date: date, end_date: date, last_wednesday: date | None = None, team: str | None = None) -> Dict[str, Any]:
@@ -322,23 +386,49 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
     Logique de calcul :
     - Taux d'inspection = (Nombre d'OR uniques avec Is Inspected = "Inspecté") / (Nombre Total d'OR uniques facturés) * 100
     - C'est un KPI trimestriel basé sur les OR, pas sur les lignes individuelles
+    
+    Résultat mis en cache par signature de la table inspection_record (lecture seule pour les appelants) :
+    la génération incrémentée à chaque upload invalide l'entrée dès qu'une écriture est validée,
+    y compris lors d'uploads concurrents (voir _table_signature).
+    Une erreur de base donne des analytics vides pour cet appel seulement : lru_cache ne
+    mémorise pas les exceptions levées par _inspection_analytics_for.
+    """
+    try:
+        signature = _table_signature("inspection_record")
+        return _inspection_analytics_for(signature, start_date, end_date, last_wednesday, team)
+    except Exception as exc:
+        print(f"⚠️ Erreur chargement inspection depuis DB: {exc}")
+        return _empty_inspection_analytics()
+
+
+def _empty_inspection_analytics() -> Dict[str, Any]:
+    """Analytics d'inspection d'une période sans données"""
+    return {
+        "total": 0,
+        "inspected": 0,
+        "not_inspected": 0,
+        "inspection_rate": 0.0,
+        "delta_weekly": 0.0,
+        "inspection_rate_last_wednesday": 0.0,
+        "by_atelier": [],
+        "by_type_materiel": [],
+        "by_technicien": [],
+        "records": [],
+    }
+
+
+@lru_cache(maxsize=32)
+def _inspection_analytics_for(signature: tuple, start_date: date, end_date: date, last_wednesday: date | None, team: str | None) -> Dict[str, Any]:
+    """Analytics d'inspection pour un état donné de la table (voir _calculate_inspection_analytics)
+
+    Les données sont lues après la signature : une écriture validée entre les deux donne au pire
+    un résultat plus récent que sa clé, recalculé à la requête suivante, jamais un résultat périmé.
     """
     # Charger les données depuis la base
     df = _load_inspection_from_db(start_date, end_date)
     
     if df is None or df.empty:
-        return {
-            "total": 0,
-            "inspected": 0,
-            "not_inspected": 0,
-            "inspection_rate": 0.0,
-            "delta_weekly": 0.0,
-            "inspection_rate_last_wednesday": 0.0,
-            "by_atelier": [],
-            "by_type_materiel": [],
-            "by_technicien": [],
-            "records": [],
-        }
+        return _empty_inspection_analytics()
     
     # Filtrer les lignes avec or_segment valide (non vide)
     df_with_or = df[df["or_segment"].notna() & (df["or_segment"].astype(str).str.strip() != "")]
@@ -351,30 +441,17 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
         ]
     
     if df_with_or.empty:
-        return {
-            "total": 0,
-            "inspected": 0,
-            "not_inspected": 0,
-            "inspection_rate": 0.0,
-            "delta_weekly": 0.0,
-            "inspection_rate_last_wednesday": 0.0,
-            "by_atelier": [],
-            "by_type_materiel": [],
-            "by_technicien": [],
-            "records": [],
-        }
+        return _empty_inspection_analytics()
     
     # Calcul basé sur les OR uniques (pas les lignes)
     # Pour chaque OR, déterminer son statut : si au moins une ligne est "Inspecté", l'OR est considéré comme inspecté
-    or_status = df_with_or.groupby("or_segment").agg({
-        "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-    }).reset_index()
+    or_status = _or_inspected(df_with_or, ["or_segment"])
     
     # Nombre total d'OR uniques facturés dans le trimestre
     total_or = len(or_status)
     
     # Nombre d'OR avec au moins une ligne "Inspecté"
-    inspected_or = len(or_status[or_status["is_inspected"] == "Inspecté"])
+    inspected_or = int(or_status.sum())
     
     # Nombre d'OR non inspectés
     not_inspected_or = total_or - inspected_or
@@ -386,17 +463,11 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
     delta_weekly = 0.0
     inspection_rate_last_wednesday = 0.0
     if last_wednesday:
-        df_last = _load_inspection_from_db(start_date, last_wednesday)
-        if df_last is not None and not df_last.empty:
-            df_last_with_or = df_last[df_last["or_segment"].notna() & (df_last["or_segment"].astype(str).str.strip() != "")]
-            if not df_last_with_or.empty:
-                or_status_last = df_last_with_or.groupby("or_segment").agg({
-                    "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-                }).reset_index()
-                total_or_last = len(or_status_last)
-                inspected_or_last = len(or_status_last[or_status_last["is_inspected"] == "Inspecté"])
-                inspection_rate_last_wednesday = (inspected_or_last / total_or_last * 100) if total_or_last > 0 else 0.0
-                delta_weekly = inspection_rate - inspection_rate_last_wednesday
+        # Seuls les deux comptages sont utiles : agrégés en SQL, sans recharger les lignes de la période
+        total_or_last, inspected_or_last = _or_inspection_counts(start_date, last_wednesday)
+        if total_or_last > 0:
+            inspection_rate_last_wednesday = inspected_or_last / total_or_last * 100
+            delta_weekly = inspection_rate - inspection_rate_last_wednesday
     
     # Pour les statistiques par atelier et type, on utilise toujours les lignes (pas les OR uniques)
     # car on veut voir la répartition des inspections par atelier/type
@@ -408,33 +479,27 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
     by_atelier = []
     if "atelier" in df_with_or.columns and not df_with_or["atelier"].isna().all():
         # Pour chaque atelier, compter les OR uniques inspectés vs total
-        atelier_or_stats = df_with_or.groupby(["atelier", "or_segment"]).agg({
-            "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-        }).reset_index()
+        atelier_or_stats = _or_inspected(df_with_or, ["atelier", "or_segment"])
         
-        atelier_stats = atelier_or_stats.groupby("atelier").agg({
-            "or_segment": "count",  # Total OR par atelier
-            "is_inspected": lambda x: (x == "Inspecté").sum(),  # OR inspectés par atelier
-        }).reset_index()
-        atelier_stats.columns = ["atelier", "total", "inspected"]
+        atelier_stats = atelier_or_stats.groupby(level="atelier", observed=True).agg(
+            total="count",  # Total OR par atelier
+            inspected="sum",  # OR inspectés par atelier
+        ).reset_index().astype({"atelier": object})
         atelier_stats["rate"] = (atelier_stats["inspected"] / atelier_stats["total"] * 100).round(2)
-        by_atelier = atelier_stats.fillna("").to_dict(orient="records")
+        by_atelier = _to_records(atelier_stats.fillna(""))
     
     # Par type de matériel - basé sur les OR uniques par type
     by_type_materiel = []
     if "type_materiel" in df_with_or.columns and not df_with_or["type_materiel"].isna().all():
         # Pour chaque type, compter les OR uniques inspectés vs total
-        type_or_stats = df_with_or.groupby(["type_materiel", "or_segment"]).agg({
-            "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté"
-        }).reset_index()
+        type_or_stats = _or_inspected(df_with_or, ["type_materiel", "or_segment"])
         
-        type_stats = type_or_stats.groupby("type_materiel").agg({
-            "or_segment": "count",  # Total OR par type
-            "is_inspected": lambda x: (x == "Inspecté").sum(),  # OR inspectés par type
-        }).reset_index()
-        type_stats.columns = ["type_materiel", "total", "inspected"]
+        type_stats = type_or_stats.groupby(level="type_materiel", observed=True).agg(
+            total="count",  # Total OR par type
+            inspected="sum",  # OR inspectés par type
+        ).reset_index().astype({"type_materiel": object})
         type_stats["rate"] = (type_stats["inspected"] / type_stats["total"] * 100).round(2)
-        by_type_materiel = type_stats.fillna("").to_dict(orient="records")
+        by_type_materiel = _to_records(type_stats.fillna(""))
     
     # Analyse par technicien - basé sur les OR uniques par technicien
     by_technicien = []
@@ -444,23 +509,22 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
         
         if not df_with_tech.empty:
             # Pour chaque technicien, compter les OR uniques qu'il a traités
-            tech_or_stats = df_with_tech.groupby(["technicien", "or_segment"]).agg({
-                "is_inspected": lambda x: "Inspecté" if (x == "Inspecté").any() else "Non Inspecté",
-                "equipe": "first",  # Prendre la première équipe pour ce technicien/OR
-            }).reset_index()
+            tech_or_stats = pd.DataFrame({
+                "is_inspected": _or_inspected(df_with_tech, ["technicien", "or_segment"]),
+                "equipe": df_with_tech.groupby(["technicien", "or_segment"], observed=True)["equipe"].first(),  # Première équipe pour ce technicien/OR
+            })
             
-            tech_stats = tech_or_stats.groupby("technicien").agg({
-                "or_segment": "count",  # Total OR traités par technicien
-                "is_inspected": lambda x: (x == "Inspecté").sum(),  # OR inspectés par technicien
-                "equipe": "first",  # Équipe du technicien
-            }).reset_index()
-            tech_stats.columns = ["technicien", "total_or", "inspected_or", "equipe"]
+            tech_stats = tech_or_stats.groupby(level="technicien", observed=True).agg(
+                total_or=("is_inspected", "count"),  # Total OR traités par technicien
+                inspected_or=("is_inspected", "sum"),  # OR inspectés par technicien
+                equipe=("equipe", "first"),  # Équipe du technicien
+            ).reset_index().astype({"technicien": object, "equipe": object})
             tech_stats["rate"] = (tech_stats["inspected_or"] / tech_stats["total_or"] * 100).round(2)
             tech_stats = tech_stats.sort_values("rate", ascending=False)
-            by_technicien = tech_stats.fillna("").to_dict(orient="records")
+            by_technicien = _to_records(tech_stats.fillna(""))
     
     # Limiter les records à 100 pour la réponse
-    records = df.head(100).to_dict(orient="records")
+    records = _to_records(df.head(100))
     
     return {
         "total": total_or,  # Nombre total d'OR uniques
@@ -479,22 +543,37 @@ def _calculate_inspection_analytics(start_date: date, end_date: date, last_wedne
     }
 
 
-def _load_from_db() -> pd.DataFrame | None:
-    try:
-        with get_conn() as conn:
-            df_db = pd.read_sql_query(
-                "SELECT jour, technicien, equipe, facturable, heures_total FROM pointage",
-                conn,
-            )
-        if df_db.empty:
-            return None
-        df_db["Saisie heures - Date"] = pd.to_datetime(df_db["jour"])
-        df_db["Facturable"] = pd.to_numeric(df_db["facturable"], errors="coerce").fillna(0)
-        df_db["Hr_Totale"] = pd.to_numeric(df_db["heures_total"], errors="coerce").fillna(0)
-        df_db = df_db.rename(columns={"technicien": "Salarié - Nom", "equipe": "Salarié - Equipe(Nom)"})
-        return _prepare_productivity_df(df_db)
-    except Exception:
-        return None
+# Statuts indexés par code : 0-3 jours ouvrés (selon les heures), 4-5 week-end
+STATUT_LUT = np.array(["Non conforme", "Incomplet", "Conforme", "Surpointage", "Weekend OK", "Travail weekend"])
+
+
+def _statut_pointage(heures: pd.Series, weekday: pd.Series) -> np.ndarray:
+    """Statut de pointage par ligne (vectorisé, sans cascade de conditions)
+
+    Jour ouvré : 0 heure -> Non conforme, < 8 -> Incomplet, 8 -> Conforme, sinon Surpointage.
+    Week-end : 0 heure -> Weekend OK, sinon Travail weekend. Le code est calculé par
+    arithmétique sur les comparaisons puis résolu par une table de correspondance.
+    """
+    h = heures.to_numpy()
+    code = 3 - (h <= 8).view(np.int8) - (h < 8).view(np.int8) - (h == 0).view(np.int8)
+    code = np.where(weekday.to_numpy() >= 5, 4 + (h != 0).view(np.int8), code)  # samedi / dimanche
+    return STATUT_LUT[code]
+
+
+def _exhaustivity_maps(agg: pd.DataFrame) -> tuple[dict, dict, dict]:
+    """Construit {tech: {jour: statut}}, {tech: {jour: heures}} et {tech: équipe}
+
+    Parcourt des listes Python (zip) plutôt que iterrows : pas de Series construite par ligne.
+    """
+    techs = agg["Salarié - Nom"].tolist()
+    days = agg["jour"].astype(int).astype(str).tolist()
+    statuts: dict = {}
+    heures: dict = {}
+    for tech, day, statut, h in zip(techs, days, agg["statut"].tolist(), agg["heures"].astype(float).tolist()):
+        statuts.setdefault(tech, {})[day] = statut
+        heures.setdefault(tech, {})[day] = h
+    teams = dict(zip(techs, agg["Salarié - Equipe(Nom)"].tolist()))
+    return statuts, heures, teams
 
 
 def _build_exhaustivity(df: pd.DataFrame, month: str | None = None, team: str | None = None) -> dict:
@@ -513,32 +592,17 @@ def _build_exhaustivity(df: pd.DataFrame, month: str | None = None, team: str |
     if team:
         target_df = target_df[target_df["Salarié - Equipe(Nom)"] == team]
 
-    def statut_pointage(h, wd):
-        if wd >= 5:
-            return "Weekend OK" if h == 0 else "Travail weekend"
-        if h == 0:
-            return "Non conforme"
-        if h < 8:
-            return "Incomplet"
-        if h == 8:
-            return "Conforme"
-        return "Surpointage"
-
     agg = (
         target_df.groupby(
             ["Salarié - Nom", "Salarié - Equipe(Nom)", "jour", "weekday"],
             as_index=False,
+            observed=True,
         )
         .agg(heures=("heures_travaillees", "sum"))
     )
-    agg["statut"] = agg.apply(lambda r: statut_pointage(r["heures"], r["weekday"]), axis=1)
+    agg["statut"] = _statut_pointage(agg["heures"], agg["weekday"])
 
-    for _, r in agg.iterrows():
-        tech = r["Salarié - Nom"]
-        day = str(int(r["jour"]))
-        exhaustivity["statuts"].setdefault(tech, {})[day] = r["statut"]
-        exhaustivity["heures"].setdefault(tech, {})[day] = float(r["heures"])
-        exhaustivity["teams"][tech] = r["Salarié - Equipe(Nom)"]
+    exhaustivity["statuts"], exhaustivity["heures"], exhaustivity["teams"] = _exhaustivity_maps(agg)
 
     return exhaustivity
 
@@ -546,20 +610,50 @@ def _build_exhaustivity(df: pd.DataFrame, month: str | None = None, team: str |
 # ==================================================
 # ENDPOINT ANALYTICS
 # ==================================================
+def _table_signature(table: str) -> tuple:
+    """Signature peu coûteuse d'une table (pointage, inspection_record) : (génération, nombre de lignes, dernier inserted_at)
+
+    La génération est incrémentée par copy_upsert dans chaque transaction d'écriture : chaque commit
+    la change, même pour un upsert sur des clés existantes validé après un upload concurrent plus
+    récent (inserted_at = now() est l'heure de début de transaction, max(inserted_at) ne bouge pas).
+    Nombre de lignes et max(inserted_at) couvrent les écritures faites hors de copy_upsert.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT
+                    (SELECT generation FROM table_generation WHERE table_name = %s),
+                    count(*),
+                    max(inserted_at)
+                FROM {table}
+                """,
+                (table,),
+            )
+            return tuple(cur.fetchone())
+
+
+@lru_cache(maxsize=4)
+def _prepared_from_db(signature: tuple) -> pd.DataFrame | None:
+    """DataFrame préparé pour un état donné de la table (partagé entre requêtes : lecture seule)"""
+    df_db = read_sql_copy(
+        "SELECT jour, technicien, equipe, facturable, heures_total FROM pointage",
+        text_columns=["technicien", "equipe"],
+    )
+    if df_db.empty:
+        return None
+    df_db["Saisie heures - Date"] = pd.to_datetime(df_db["jour"])
+    # Colonnes numeric déjà parsées en float par read_csv : seuls les NULL restent à remplacer
+    df_db["Facturable"] = df_db["facturable"].fillna(0)
+    df_db["Hr_Totale"] = df_db["heures_total"].fillna(0)
+    df_db = df_db.rename(columns={"technicien": "Salarié - Nom", "equipe": "Salarié - Equipe(Nom)"})
+    return _prepare_productivity_df(df_db)
+
+
 def _load_from_db() -> pd.DataFrame | None:
     try:
-        with get_conn() as conn:
-            df_db = pd.read_sql_query(
-                "SELECT jour, technicien, equipe, facturable, heures_total FROM pointage",
-                conn,
-            )
-        if df_db.empty:
-            return None
-        df_db["Saisie heures - Date"] = pd.to_datetime(df_db["jour"])
-        df_db["Facturable"] = pd.to_numeric(df_db["facturable"], errors="coerce").fillna(0)
-        df_db["Hr_Totale"] = pd.to_numeric(df_db["heures_total"], errors="coerce").fillna(0)
-        df_db = df_db.rename(columns={"technicien": "Salarié - Nom", "equipe": "Salarié - Equipe(Nom)"})
-        return _prepare_productivity_df(df_db)
+        # Préparation réutilisée tant que la table n'a pas changé (génération incrémentée à chaque upload)
+        return _prepared_from_db(_table_signature("pointage"))
     except Exception:
         return None
 
@@ -574,7 +668,7 @@ async def debug_productivity():
         df = db_df
         source = "database"
     elif LATEST_PRODUCTIVITY_DF is not None and not LATEST_PRODUCTIVITY_DF.empty:
-        df = LATEST_PRODUCTIVITY_DF.copy()
+        df = LATEST_PRODUCTIVITY_DF
         source = "memory"
     else:
         return {"error": "Aucune donnée chargée"}
@@ -615,16 +709,14 @@ async def debug_productivity():
     
     # Agrégation par technicien (top 5)
     tech_agg = (
-        df.groupby("Salarié - Nom")
+        df.groupby("Salarié - Nom", observed=True)
         .agg(
             facturable=("Facturable", "sum"),
             heures=("heures_travaillees", "sum")
         )
         .reset_index()
     )
-    tech_agg["productivite"] = (
-        tech_agg["facturable"] / tech_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    tech_agg["productivite"] = safe_ratio(tech_agg["facturable"], tech_agg["heures"], positive_only=False)
     tech_agg = tech_agg.sort_values("productivite", ascending=False).head(5)
     
     return {
@@ -634,21 +726,38 @@ async def debug_productivity():
     }
 
 
+@lru_cache(maxsize=4)
+def _analytics_json_from_db(signature: tuple) -> bytes:
+    """Réponse JSON des analytics, calculée et sérialisée une fois par signature de la table pointage (pré-calculée à l'upload)
+
+    La signature inclut la génération de pointage (voir _table_signature) : un upload validé,
+    même concurrent d'un autre, change la clé et la réponse est recalculée.
+
+    Le dict ne contient que des types Python natifs : rendu direct par JSONResponse,
+    sans le parcours jsonable_encoder que FastAPI referait à chaque requête.
+    """
+    return JSONResponse(_productivity_analytics(_prepared_from_db(signature))).body
+
+
 @app.get("/kpi/productivite/analytics")
 async def get_productivity():
-    global LATEST_PRODUCTIVITY_DF
-
-    db_df = _load_from_db()
+    try:
+        signature = _table_signature("pointage")
+        db_df = _prepared_from_db(signature)
+    except Exception:
+        db_df = None
     if db_df is not None and not db_df.empty:
-        df = db_df
-    elif LATEST_PRODUCTIVITY_DF is not None and not LATEST_PRODUCTIVITY_DF.empty:
-        df = LATEST_PRODUCTIVITY_DF.copy()
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Aucune donnée chargée. Veuillez importer un fichier.",
-        )
+        return Response(content=_analytics_json_from_db(signature), media_type="application/json")
 
+    if LATEST_PRODUCTIVITY_DF is not None and not LATEST_PRODUCTIVITY_DF.empty:
+        return _productivity_analytics(LATEST_PRODUCTIVITY_DF)
+    raise HTTPException(
+        status_code=400,
+        detail="Aucune donnée chargée. Veuillez importer un fichier.",
+    )
+
+
+def _productivity_analytics(df: pd.DataFrame) -> Dict[str, Any]:
     # =========================
     # GLOBAL KPI
     # =========================
@@ -656,84 +765,44 @@ async def get_productivity():
     total_fact = float(df["Facturable"].sum())
     global_prod = total_fact / total_hours if total_hours else 0.0
 
+    # Une seule passe sur les lignes (mois × équipe × technicien), les lignes sans équipe comptent dans
+    # les totaux mensuels et techniciens ; toutes les séries ci-dessous sont dérivées de ce petit agrégat
+    base_agg = (
+        df.groupby(["month_num", "mois", "Salarié - Equipe(Nom)", "Salarié - Nom"], dropna=False, observed=True)[["Facturable", "heures_travaillees"]]
+        .sum()
+        .set_axis(["facturable", "heures"], axis=1)
+    )
+
     # =========================
     # MONTHLY
     # =========================
-    monthly_agg = (
-        df.groupby(["month_num", "mois"])
-        .agg(
-            facturable=("Facturable", "sum"),
-            heures=("heures_travaillees", "sum")
-        )
-        .reset_index()
-    )
-    monthly_agg["productivite"] = (
-        monthly_agg["facturable"] / monthly_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    monthly_agg = base_agg.groupby(level=["month_num", "mois"], observed=True).sum().reset_index()
+    monthly_agg["productivite"] = safe_ratio(monthly_agg["facturable"], monthly_agg["heures"], positive_only=False)
     monthly = monthly_agg.sort_values("month_num")[["mois", "productivite"]]
 
     # =========================
     # TECHNICIENS / ÉQUIPES
     # =========================
-    tech_agg = (
-        df.groupby("Salarié - Nom")
-        .agg(
-            facturable=("Facturable", "sum"),
-            heures=("heures_travaillees", "sum")
-        )
-        .reset_index()
-    )
-    tech_agg["productivite"] = (
-        tech_agg["facturable"] / tech_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    tech_agg = base_agg.groupby(level="Salarié - Nom", observed=True).sum().reset_index()
+    tech_agg["productivite"] = safe_ratio(tech_agg["facturable"], tech_agg["heures"], positive_only=False)
     technicians = tech_agg.sort_values("productivite", ascending=False)[["Salarié - Nom", "productivite"]]
 
-    team_agg = (
-        df.groupby("Salarié - Equipe(Nom)")
-        .agg(
-            facturable=("Facturable", "sum"),
-            heures=("heures_travaillees", "sum")
-        )
-        .reset_index()
-    )
-    team_agg["productivite"] = (
-        team_agg["facturable"] / team_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    team_agg = base_agg.groupby(level="Salarié - Equipe(Nom)", observed=True).sum().reset_index()
+    team_agg["productivite"] = safe_ratio(team_agg["facturable"], team_agg["heures"], positive_only=False)
     teams = team_agg[["Salarié - Equipe(Nom)", "productivite"]]
 
     # =========================
     # CORRÉLATION ÉQUIPES
     # =========================
-    # Calculer la productivité mensuelle globale avec sum/sum
-    monthly_agg_corr = (
-        df.groupby("mois")
-        .agg(
-            facturable=("Facturable", "sum"),
-            heures=("heures_travaillees", "sum")
-        )
-    )
-    monthly_avg = (
-        monthly_agg_corr["facturable"] / monthly_agg_corr["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
-
-    # Calculer la productivité par équipe/mois avec sum/sum
-    team_month_agg = (
-        df.groupby(["mois", "Salarié - Equipe(Nom)"])
-        .agg(
-            facturable=("Facturable", "sum"),
-            heures=("heures_travaillees", "sum")
-        )
-        .reset_index()
-    )
-    team_month_agg["productivite"] = (
-        team_month_agg["facturable"] / team_month_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
-    team_month = team_month_agg[["mois", "Salarié - Equipe(Nom)", "productivite"]]
-
-    pivot_corr = team_month.pivot(
-        index="mois",
-        columns="Salarié - Equipe(Nom)",
-        values="productivite"
+    # Productivité mensuelle globale avec sum/sum (mois et month_num sont en bijection)
+    monthly_agg_corr = monthly_agg.set_index("mois")
+    monthly_avg = monthly_agg_corr["productivite"]
+
+    # Productivité par équipe/mois avec sum/sum (mois × équipes, lignes sans équipe exclues)
+    team_month_agg = base_agg.groupby(level=["mois", "Salarié - Equipe(Nom)"], observed=True).sum()
+    pivot_corr = (
+        pd.Series(safe_ratio(team_month_agg["facturable"], team_month_agg["heures"], positive_only=False), index=team_month_agg.index)
+        .unstack("Salarié - Equipe(Nom)")
     )
 
     correlations = pivot_corr.corrwith(monthly_avg).dropna().sort_values(ascending=False)
@@ -750,45 +819,25 @@ async def get_productivity():
     # =========================
     # EXHAUSTIVITÉ
     # =========================
-    def statut_pointage(h, wd):
-        if wd >= 5:
-            return "Weekend OK" if h == 0 else "Travail weekend"
-        if h == 0:
-            return "Non conforme"
-        if h < 8:
-            return "Incomplet"
-        if h == 8:
-            return "Conforme"
-        return "Surpointage"
-
     exhaustivity = {"periods": [], "per_period": {}}
 
-    for period in sorted(df["mois_period"].unique()):
-        df_p = df[df["mois_period"] == period]
-
-        agg = (
-            df_p.groupby(
-                ["Salarié - Nom", "Salarié - Equipe(Nom)", "jour", "weekday"],
-                as_index=False,
-            )
-            .agg(heures=("heures_travaillees", "sum"))
-        )
-
-        agg["statut"] = agg.apply(
-            lambda r: statut_pointage(r["heures"], r["weekday"]), axis=1
+    # Une seule agrégation pour toutes les périodes, puis découpage par période
+    full_agg = (
+        df.groupby(
+            ["mois_period", "Salarié - Nom", "Salarié - Equipe(Nom)", "jour", "weekday"],
+            as_index=False,
+            observed=True,
         )
+        .agg(heures=("heures_travaillees", "sum"))
+    )
+    full_agg["statut"] = _statut_pointage(full_agg["heures"], full_agg["weekday"])
+    agg_by_period = dict(list(full_agg.groupby("mois_period", sort=False, observed=True)))
 
-        statuts = {}
-        heures = {}
-        teams_map = {}
-
-        for _, r in agg.iterrows():
-            tech = r["Salarié - Nom"]
-            day = str(int(r["jour"]))
+    for period in sorted(df["mois_period"].unique()):
+        # Période sans ligne agrégeable (ex. équipe manquante) : dicts vides comme auparavant
+        agg = agg_by_period.get(period, full_agg.iloc[:0])
 
-            statuts.setdefault(tech, {})[day] = r["statut"]
-            heures.setdefault(tech, {})[day] = float(r["heures"])
-            teams_map[tech] = r["Salarié - Equipe(Nom)"]
+        statuts, heures, teams_map = _exhaustivity_maps(agg)
 
         exhaustivity["periods"].append(period)
         exhaustivity["per_period"][period] = {
@@ -823,7 +872,7 @@ async def get_exhaustivite(month: str | None = None, team: str | None = None):
     if db_df is not None and not db_df.empty:
         df = db_df
     elif LATEST_PRODUCTIVITY_DF is not None and not LATEST_PRODUCTIVITY_DF.empty:
-        df = LATEST_PRODUCTIVITY_DF.copy()
+        df = LATEST_PRODUCTIVITY_DF
     else:
         raise HTTPException(status_code=400, detail="Aucune donnée chargée. Veuillez importer un fichier.")
     exhaust = _build_exhaustivity(df, month=month, team=team)
@@ -833,6 +882,84 @@ async def get_exhaustivite(month: str | None = None, team: str | None = None):
 # ==================================================
 # UPLOAD DATA
 # ==================================================
+# Reconnaissance des colonnes d'inspection (premier motif qui correspond), compilée une fois
+_INSPECTION_COLUMN_PATTERNS = [
+    (re.compile(r"(?<![a-z])sn(?![a-z])|serial", re.I), "sn"),
+    (re.compile(r"^(?=.*date)(?=.*facture)", re.I), "date_facture"),
+    (re.compile(r"inspect", re.I), "is_inspected"),
+    (re.compile(r"^(?=.*(?<![a-z])or(?![a-z]))(?=.*segment)", re.I), "or_segment"),
+    (re.compile(r"^(?=.*type)(?=.*materiel)", re.I), "type_materiel"),
+    (re.compile(r"atelier", re.I), "atelier"),
+]
+# Colonne du numéro d'OR : le mot "or" (pas une sous-chaîne, ex. "normalisation") et "numéro"
+_OR_NUMBER_COLUMN = re.compile(r"^(?=.*(?<![a-z])or(?![a-z]))(?=.*num[eé]ro)", re.I)
+
+
+def _inspection_column_mapping(columns) -> dict[str, str]:
+    """Renommage des colonnes d'inspection vers les noms attendus (sn, date_facture, ...)"""
+    mapping = {}
+    for col in columns:
+        tag = next((tag for pattern, tag in _INSPECTION_COLUMN_PATTERNS if pattern.search(col)), None)
+        if tag:
+            mapping[col] = tag
+    return mapping
+
+
+def _inspection_rows(df: pd.DataFrame) -> list[tuple]:
+    """Tuples (sn, or_segment, type_materiel, atelier, date_facture, is_inspected) construits colonne par colonne"""
+    def texte(col: str) -> list[str]:
+        if col not in df.columns:
+            return [""] * len(df)
+        return [str(v or "") for v in df[col].tolist()]
+
+    return list(zip(
+        [str(v) for v in df["sn"].tolist()],
+        [v.strip() for v in texte("or_segment")],
+        texte("type_materiel"),
+        texte("atelier"),
+        df["date_facture"].dt.date.tolist(),
+        [str(v) for v in df["is_inspected"].tolist()],
+    ))
+
+
+# Colonnes de productivité utilisées après l'upload (les autres ne sont pas parsées)
+PRODUCTIVITY_UPLOAD_COLUMNS = {"Saisie heures - Date", "Salarié - Nom", "Salarié - Equipe(Nom)", "Facturable", "Hr_Totale"}
+
+
+def _is_or_column(col) -> bool:
+    """Colonne du numéro d'OR (ex. "OR (Numéro)")"""
+    return bool(_OR_NUMBER_COLUMN.search(str(col)))
+
+
+def _productivity_usecol(col) -> bool:
+    """Filtre usecols de lecture du fichier de productivité"""
+    return col in PRODUCTIVITY_UPLOAD_COLUMNS or _is_or_column(col)
+
+
+def _techniciens_par_or(cur, or_segments) -> dict[str, tuple]:
+    """Technicien / équipe ayant le plus d'heures pointées sur chaque OR, en une seule requête
+
+    Même règle que l'ancienne recherche ligne à ligne : or_numero contenant le segment.
+    """
+    if not or_segments:
+        return {}
+    cur.execute(
+        """
+        SELECT seg, technicien, equipe
+        FROM (
+            SELECT s.seg, p.technicien, p.equipe,
+                   ROW_NUMBER() OVER (PARTITION BY s.seg ORDER BY SUM(p.heures_total) DESC) AS rn
+            FROM unnest(%s::text[]) AS s(seg)
+            JOIN pointage p ON p.or_numero LIKE '%%' || s.seg || '%%'
+            GROUP BY s.seg, p.technicien, p.equipe
+        ) t
+        WHERE rn = 1
+        """,
+        (list(or_segments),),
+    )
+    return {seg: (technicien, equipe) for seg, technicien, equipe in cur.fetchall()}
+
+
 @app.post("/kpi/productivite/upload")
 async def upload_kpi(request: Request, file: UploadFile = File(...)):
     user = getattr(request.state, "user", None)
@@ -856,29 +983,34 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
     try:
         # Pour les fichiers Excel, vérifier s'il y a plusieurs onglets
         if suffix in {".xlsx", ".xls"}:
-            excel_file = pd.ExcelFile(buffer)
+            excel_file = pd.ExcelFile(buffer, engine=EXCEL_ENGINE)
             sheet_names = excel_file.sheet_names
             
             # Chercher l'onglet de productivité (premier onglet ou celui avec les colonnes attendues)
-            df = None
-            inspection_df = None
+            # sur les seuls en-têtes : chaque onglet n'est ensuite lu qu'une fois
+            productivity_sheet = sheet_names[0] if sheet_names else None
+            inspection_sheet = None
             
             for sheet_name in sheet_names:
-                sheet_df = pd.read_excel(excel_file, sheet_name=sheet_name)
+                columns = set(pd.read_excel(excel_file, sheet_name=sheet_name, nrows=0).columns)
                 # Vérifier si c'est un onglet de productivité
-                if {"Saisie heures - Date", "Salarié - Nom", "Facturable"}.issubset(set(sheet_df.columns)):
-                    df = sheet_df
+                if {"Saisie heures - Date", "Salarié - Nom", "Facturable"}.issubset(columns):
+                    productivity_sheet = sheet_name
                 # Vérifier si c'est un onglet d'inspection
-                elif {"sn", "date_facture", "is_inspected"}.issubset(set(sheet_df.columns)) or \
-                     {"SN", "Date Facture", "Is Inspected"}.issubset(set(sheet_df.columns)):
-                    inspection_df = sheet_df
+                elif {"sn", "date_facture", "is_inspected"}.issubset(columns) or \
+                     {"SN", "Date Facture", "Is Inspected"}.issubset(columns):
+                    inspection_sheet = sheet_name
             
-            # Si pas trouvé, prendre le premier onglet comme productivité
-            if df is None and sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_names[0])
+            # Productivité : seules les colonnes utilisées en aval sont parsées
+            df = None
+            if productivity_sheet is not None:
+                df = pd.read_excel(excel_file, sheet_name=productivity_sheet, usecols=_productivity_usecol)
+            inspection_df = None
+            if inspection_sheet is not None:
+                inspection_df = pd.read_excel(excel_file, sheet_name=inspection_sheet)
         else:
             # Pour CSV, on ne peut traiter qu'un seul type à la fois
-            df = pd.read_csv(buffer)
+            df = pd.read_csv(buffer, usecols=_productivity_usecol)
             inspection_df = None
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Erreur lecture fichier: {str(exc)}")
@@ -907,11 +1039,7 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
     df_prepared = _prepare_productivity_df(df)
 
     # Vérifier si la colonne "OR (Numéro)" existe
-    or_col = None
-    for col in df_prepared.columns:
-        if "or" in col.lower() and ("numéro" in col.lower() or "numero" in col.lower()):
-            or_col = col
-            break
+    or_col = next((col for col in df_prepared.columns if _is_or_column(col)), None)
     
     # Agrégation par technicien / jour
     groupby_cols = ["Saisie heures - Date", "Salarié - Nom", "Salarié - Equipe(Nom)"]
@@ -919,139 +1047,84 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
         groupby_cols.append(or_col)
     
     grouped = (
-        df_prepared.groupby(groupby_cols, as_index=False)
+        df_prepared.groupby(groupby_cols, as_index=False, observed=True)
         .agg(
             facturable=("Facturable", "sum"),
             heures_total=("heures_travaillees", "sum"),
         )
     )
 
-    rows = []
-    for _, r in grouped.iterrows():
-        rows.append((
-            r["Saisie heures - Date"].date(),
-            r["Salarié - Nom"],
-            r["Salarié - Equipe(Nom)"],
-            float(r["facturable"]),
-            float(r["heures_total"]),
-            str(r.get(or_col, "")) if or_col else None,
-        ))
+    # Tuples construits colonne par colonne (zip) plutôt qu'une Series par ligne (iterrows)
+    rows = list(zip(
+        grouped["Saisie heures - Date"].dt.date.tolist(),
+        grouped["Salarié - Nom"].tolist(),
+        grouped["Salarié - Equipe(Nom)"].tolist(),
+        grouped["facturable"].astype(float).tolist(),
+        grouped["heures_total"].astype(float).tolist(),
+        grouped[or_col].astype(str).tolist() if or_col else [None] * len(grouped),
+    ))
 
+    # Pointage et inspection dans une seule connexion / transaction (un seul commit)
     ensure_schema()
+    inspection_rows = 0
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(POINTAGE_SCHEMA)
-            cur.executemany(
-                """
-                INSERT INTO pointage (jour, technicien, equipe, facturable, heures_total, or_numero)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (technicien, jour)
-                DO UPDATE SET
-                    equipe = EXCLUDED.equipe,
-                    facturable = EXCLUDED.facturable,
-                    heures_total = EXCLUDED.heures_total,
-                    or_numero = EXCLUDED.or_numero,
-                    inserted_at = now();
-                """,
+            copy_upsert(
+                cur,
+                "pointage",
+                ["jour", "technicien", "equipe", "facturable", "heures_total", "or_numero"],
+                ["technicien", "jour"],
                 rows,
             )
+
+            # Traiter les données d'inspection si présentes
+            if inspection_df is not None:
+                try:
+                    # Point de sauvegarde : un échec de l'inspection n'annule pas le pointage
+                    with conn.transaction():
+                        # Normaliser les noms de colonnes (insensible à la casse)
+                        inspection_df.columns = inspection_df.columns.str.strip()
+                        col_mapping = _inspection_column_mapping(inspection_df.columns)
+
+                        inspection_df = inspection_df.rename(columns=col_mapping)
+
+                        # Normaliser les données
+                        inspection_df["date_facture"] = pd.to_datetime(inspection_df["date_facture"], errors="coerce")
+                        inspection_df = inspection_df.dropna(subset=["date_facture", "sn"])
+                        inspection_df["is_inspected"] = inspection_df["is_inspected"].astype(str).str.strip()
+
+                        # Préparer les données pour insertion (technicien avec le plus d'heures sur chaque OR)
+                        inspection_rows_data = _inspection_rows(inspection_df)
+                        techniciens = _techniciens_par_or(cur, {r[1] for r in inspection_rows_data if r[1]})
+                        inspection_rows_data = [r + techniciens.get(r[1], (None, None)) for r in inspection_rows_data]
+
+                        # Insérer les données d'inspection
+                        if inspection_rows_data:
+                            copy_upsert(
+                                cur,
+                                "inspection_record",
+                                ["sn", "or_segment", "type_materiel", "atelier", "date_facture", "is_inspected", "technicien", "equipe"],
+                                ["sn", "date_facture"],
+                                inspection_rows_data,
+                            )
+                            inspection_rows = len(inspection_rows_data)
+                except Exception as exc:
+                    # Ne pas faire échouer l'upload de productivité si l'inspection échoue
+                    print(f"⚠️ Erreur traitement inspection: {exc}")
         conn.commit()
 
     global LATEST_PRODUCTIVITY_DF
     LATEST_PRODUCTIVITY_DF = df_prepared
 
-    # Traiter les données d'inspection si présentes
-    inspection_rows = 0
-    if inspection_df is not None:
-        try:
-            # Normaliser les noms de colonnes (insensible à la casse)
-            inspection_df.columns = inspection_df.columns.str.strip()
-            col_mapping = {}
-            for col in inspection_df.columns:
-                col_lower = col.lower()
-                if "sn" in col_lower or "serial" in col_lower:
-                    col_mapping[col] = "sn"
-                elif "date" in col_lower and "facture" in col_lower:
-                    col_mapping[col] = "date_facture"
-                elif "inspect" in col_lower:
-                    col_mapping[col] = "is_inspected"
-                elif "or" in col_lower and "segment" in col_lower:
-                    col_mapping[col] = "or_segment"
-                elif "type" in col_lower and "materiel" in col_lower:
-                    col_mapping[col] = "type_materiel"
-                elif "atelier" in col_lower:
-                    col_mapping[col] = "atelier"
-            
-            inspection_df = inspection_df.rename(columns=col_mapping)
-            
-            # Normaliser les données
-            inspection_df["date_facture"] = pd.to_datetime(inspection_df["date_facture"], errors="coerce")
-            inspection_df = inspection_df.dropna(subset=["date_facture", "sn"])
-            inspection_df["is_inspected"] = inspection_df["is_inspected"].astype(str).str.strip()
-            
-            # Préparer les données pour insertion
-            inspection_rows_data = []
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    for _, row in inspection_df.iterrows():
-                        or_segment = str(row.get("or_segment", "") or "").strip()
-                        technicien = None
-                        equipe = None
-                        
-                        # Chercher le technicien avec le plus d'heures sur l'OR
-                        if or_segment:
-                            cur.execute(
-                                """
-                                SELECT technicien, equipe, SUM(heures_total) as total_heures
-                                FROM pointage
-                                WHERE or_numero = %s OR or_numero LIKE %s
-                                GROUP BY technicien, equipe
-                                ORDER BY total_heures DESC
-                                LIMIT 1
-                                """,
-                                (or_segment, f"%{or_segment}%"),
-                            )
-                            result = cur.fetchone()
-                            if result:
-                                technicien = result[0]
-                                equipe = result[1]
-                        
-                        inspection_rows_data.append((
-                            str(row["sn"]),
-                            or_segment,
-                            str(row.get("type_materiel", "") or ""),
-                            str(row.get("atelier", "") or ""),
-                            row["date_facture"].date(),
-                            str(row["is_inspected"]),
-                            technicien,
-                            equipe,
-                        ))
-            
-            # Insérer les données d'inspection
-            if inspection_rows_data:
-                with get_conn() as conn:
-                    with conn.cursor() as cur:
-                        cur.executemany(
-                            """
-                            INSERT INTO inspection_record (sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT (sn, date_facture)
-                            DO UPDATE SET
-                                or_segment = EXCLUDED.or_segment,
-                                type_materiel = EXCLUDED.type_materiel,
-                                atelier = EXCLUDED.atelier,
-                                is_inspected = EXCLUDED.is_inspected,
-                                technicien = EXCLUDED.technicien,
-                                equipe = EXCLUDED.equipe,
-                                inserted_at = now();
-                            """,
-                            inspection_rows_data,
-                        )
-                    conn.commit()
-                inspection_rows = len(inspection_rows_data)
-        except Exception as exc:
-            # Ne pas faire échouer l'upload de productivité si l'inspection échoue
-            print(f"⚠️ Erreur traitement inspection: {exc}")
+    # Pré-calcul des analytics pour le nouvel état de la table (les GET suivants sont servis du cache)
+    try:
+        signature = _table_signature("pointage")
+        db_df = _prepared_from_db(signature)
+        if db_df is not None and not db_df.empty:
+            _analytics_json_from_db(signature)
+    except Exception as exc:
+        # L'upload est déjà validé : le pré-calcul sera refait au prochain GET
+        print(f"⚠️ Erreur pré-calcul analytics productivité: {exc}")
 
     return {
         "message": "Données agrégées et sauvegardées en base (1 ligne par technicien/jour)",
@@ -1093,7 +1166,7 @@ async def upload_inspection(request: Request, file: UploadFile = File(...)):
     buffer = BytesIO(await file.read())
 
     try:
-        df = pd.read_excel(buffer) if suffix != ".csv" else pd.read_csv(buffer)
+        df = pd.read_excel(buffer, engine=EXCEL_ENGINE) if suffix != ".csv" else pd.read_csv(buffer)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
@@ -1127,61 +1200,18 @@ async def upload_inspection(request: Request, file: UploadFile = File(...)):
 
     # Pour chaque ligne, chercher le technicien avec le plus d'heures sur l'OR
     ensure_schema()
-    rows = []
-    
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for _, row in df.iterrows():
-                or_segment = str(row.get("or_segment", "") or "").strip()
-                technicien = None
-                equipe = None
-                
-                # Si on a un OR segment, chercher le technicien avec le plus d'heures
-                if or_segment:
-                    cur.execute(
-                        """
-                        SELECT technicien, equipe, SUM(heures_total) as total_heures
-                        FROM pointage
-                        WHERE or_numero = %s OR or_numero LIKE %s
-                        GROUP BY technicien, equipe
-                        ORDER BY total_heures DESC
-                        LIMIT 1
-                        """,
-                        (or_segment, f"%{or_segment}%"),
-                    )
-                    result = cur.fetchone()
-                    if result:
-                        technicien = result[0]
-                        equipe = result[1]
-                
-                rows.append((
-                    str(row["sn"]),
-                    or_segment,
-                    str(row.get("type_materiel", "") or ""),
-                    str(row.get("atelier", "") or ""),
-                    row["date_facture"].date(),
-                    str(row["is_inspected"]),
-                    technicien,
-                    equipe,
-                ))
+    rows = _inspection_rows(df)
 
-    # Insérer en base
+    # Technicien avec le plus d'heures sur chaque OR (une requête), puis insertion, sur la même connexion
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(
-                """
-                INSERT INTO inspection_record (sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (sn, date_facture)
-                DO UPDATE SET
-                    or_segment = EXCLUDED.or_segment,
-                    type_materiel = EXCLUDED.type_materiel,
-                    atelier = EXCLUDED.atelier,
-                    is_inspected = EXCLUDED.is_inspected,
-                    technicien = EXCLUDED.technicien,
-                    equipe = EXCLUDED.equipe,
-                    inserted_at = now();
-                """,
+            techniciens = _techniciens_par_or(cur, {r[1] for r in rows if r[1]})
+            rows = [r + techniciens.get(r[1], (None, None)) for r in rows]
+            copy_upsert(
+                cur,
+                "inspection_record",
+                ["sn", "or_segment", "type_materiel", "atelier", "date_facture", "is_inspected", "technicien", "equipe"],
+                ["sn", "date_facture"],
                 rows,
             )
         conn.commit()
@@ -1220,15 +1250,15 @@ async def get_inspection_analytics(request: Request, year: int | None = None, qu
     
     if current_weekday == 2:  # Si on est mercredi
         # Le mercredi dernier est il y a 7 jours
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:  # Jeudi, vendredi, samedi, dimanche
         # Le mercredi dernier est dans la semaine actuelle
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:  # Lundi ou mardi
         # Le mercredi dernier est la semaine dernière
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
 
     # Utiliser la fonction utilitaire commune pour calculer les analytics
     analytics = _calculate_inspection_analytics(start_date, end_date, last_wednesday, team)
@@ -1265,13 +1295,13 @@ async def get_inspection_snapshot(request: Request):
     
     # Calculer le mercredi dernier
     if current_weekday == 2:
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     
     # Utiliser la fonction utilitaire commune
     analytics = _calculate_inspection_analytics(start_date, end_date, last_wednesday)
@@ -1582,7 +1612,7 @@ def generate_meeting_summary(meeting_date: date | None = None) -> Dict[str, Any]
     if db_df is not None and not db_df.empty:
         df = db_df
     elif LATEST_PRODUCTIVITY_DF is not None and not LATEST_PRODUCTIVITY_DF.empty:
-        df = LATEST_PRODUCTIVITY_DF.copy()
+        df = LATEST_PRODUCTIVITY_DF
     else:
         return {
             "error": "Aucune donnée disponible",
@@ -1601,13 +1631,13 @@ def generate_meeting_summary(meeting_date: date | None = None) -> Dict[str, Any]
     
     # Calculer le mercredi dernier
     if current_weekday == 2:
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     
     inspection_analytics = _calculate_inspection_analytics(start_date, end_date, last_wednesday)
     
@@ -1892,10 +1922,9 @@ async def generate_cr(request: Request):
                 cr_id = cur.fetchone()[0]
                 conn.commit()
         
-        # Retourner le PDF
-        pdf_buffer.seek(0)
-        return StreamingResponse(
-            BytesIO(pdf_buffer.read()),
+        # Retourner le PDF (déjà entièrement construit par reportlab : une seule copie, Content-Length connu)
+        return Response(
+            content=pdf_buffer.getvalue(),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename=CR_SEP_{meeting_date.isoformat()}.pdf"
@@ -1997,10 +2026,9 @@ async def download_cr(request: Request, cr_id: int):
                 ]
         
         pdf_buffer = create_pdf_summary(summary, actions, notes)
-        pdf_buffer.seek(0)
         
-        return StreamingResponse(
-            BytesIO(pdf_buffer.read()),
+        return Response(
+            content=pdf_buffer.getvalue(),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename=CR_SEP_{meeting_date.isoformat()}.pdf"
@@ -1,13 +1,18 @@
 """Preprocessing des données d'inspection"""
 import pandas as pd
 from datetime import date
-from database import get_conn
+from database import read_sql_copy
+
+
+# Colonnes à faible cardinalité, stockées en category pour les groupby/filtres KPI
+CATEGORY_COLUMNS = ["is_inspected", "type_materiel", "atelier", "technicien", "equipe"]
 
 
 def load_raw_inspection_data(
     start_date: date | None = None,
     end_date: date | None = None,
-    team: str | None = None
+    team: str | None = None,
+    raise_errors: bool = False,
 ) -> pd.DataFrame | None:
     """Charge les données brutes d'inspection depuis la base de données
     
@@ -15,36 +20,43 @@ def load_raw_inspection_data(
         start_date: Date de début du filtre (optionnel)
         end_date: Date de fin du filtre (optionnel)
         team: Nom de l'équipe pour filtrer (optionnel)
+        raise_errors: Propager les erreurs de base au lieu de retourner None
+            (permet à l'appelant de distinguer "erreur" de "aucune ligne")
         
     Returns:
         DataFrame brut avec colonnes: sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe
     """
     try:
-        with get_conn() as conn:
-            query = """
-                SELECT sn, or_segment, type_materiel, atelier, date_facture, 
-                       is_inspected, technicien, equipe 
-                FROM inspection_record
-            """
-            params = []
-            conditions = []
-
-            if start_date and end_date:
-                conditions.append("date_facture >= %s AND date_facture <= %s")
-                params.extend([start_date, end_date])
-            
-            if team:
-                conditions.append("equipe ILIKE %s")
-                params.append(f"%{team}%")
-
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-            
-            query += " ORDER BY date_facture DESC"
-            
-            df = pd.read_sql_query(query, conn, params=params if params else None)
-            return df if not df.empty else None
+        query = """
+            SELECT sn, or_segment, type_materiel, atelier, date_facture, 
+                   is_inspected, technicien, equipe 
+            FROM inspection_record
+        """
+        params = []
+        conditions = []
+
+        if start_date and end_date:
+            conditions.append("date_facture >= %s AND date_facture <= %s")
+            params.extend([start_date, end_date])
+        
+        if team:
+            conditions.append("equipe ILIKE %s")
+            params.append(f"%{team}%")
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        query += " ORDER BY date_facture DESC"
+        
+        df = read_sql_copy(
+            query,
+            params if params else None,
+            text_columns=["sn", "or_segment", "type_materiel", "atelier", "is_inspected", "technicien", "equipe"],
+        )
+        return df if not df.empty else None
     except Exception as exc:
+        if raise_errors:
+            raise
         print(f"⚠️ Erreur chargement données inspection: {exc}")
         return None
 
@@ -60,6 +72,7 @@ def preprocess_inspection_df(df: pd.DataFrame) -> pd.DataFrame:
         - Filtrage des lignes avec or_segment valide
         - Normalisation des valeurs
         - Colonnes calculées si nécessaire
+        - Colonnes de CATEGORY_COLUMNS en dtype category
     """
     if df is None or df.empty:
         return pd.DataFrame()
@@ -84,6 +97,9 @@ def preprocess_inspection_df(df: pd.DataFrame) -> pd.DataFrame:
     df["technicien"] = df["technicien"].astype(str).str.strip()
     df["equipe"] = df["equipe"].astype(str).str.strip()
 
+    # Typage category (mémoire réduite, hachage sur codes entiers)
+    df[CATEGORY_COLUMNS] = df[CATEGORY_COLUMNS].astype("category")
+
     return df
 
 
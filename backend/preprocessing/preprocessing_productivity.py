@@ -1,7 +1,8 @@
 """Preprocessing des données de productivité"""
 import pandas as pd
 from fastapi import HTTPException
-from database import get_conn
+from database import read_sql_copy
+from utils.ratios import safe_ratio
 
 # Constantes de colonnes (alignées avec le code Streamlit fourni)
 COL_TECHNICIEN = "Salarié - Nom"
@@ -22,11 +23,10 @@ STANDARDIZED_JOUR_SEMAINE = "Jour_semaine"
 def load_raw_productivity_data() -> pd.DataFrame | None:
     """Charge les données brutes de productivité depuis la base de données"""
     try:
-        with get_conn() as conn:
-            df_db = pd.read_sql_query(
-                "SELECT jour, technicien, equipe, facturable, heures_total FROM pointage",
-                conn,
-            )
+        df_db = read_sql_copy(
+            "SELECT jour, technicien, equipe, facturable, heures_total FROM pointage",
+            text_columns=["technicien", "equipe"],
+        )
         if df_db.empty:
             return None
         
@@ -74,9 +74,7 @@ def preprocess_productivity_df(df: pd.DataFrame) -> pd.DataFrame:
     df[STANDARDIZED_JOUR_SEMAINE] = df[COL_DATE].dt.weekday  # 0=lundi, 6=dimanche
 
     # Calculer la productivité par ligne (peut être utile pour des agrégations ultérieures)
-    df["productivite_ligne"] = (
-        df[STANDARDIZED_FACTURABLE] / df[STANDARDIZED_HEURES]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    df["productivite_ligne"] = safe_ratio(df[STANDARDIZED_FACTURABLE], df[STANDARDIZED_HEURES], positive_only=False)
 
     return df
 
@@ -117,8 +115,6 @@ def preprocess_uploaded_productivity_file(df: pd.DataFrame) -> pd.DataFrame:
     df[STANDARDIZED_JOUR] = df[COL_DATE].dt.day
     df[STANDARDIZED_JOUR_SEMAINE] = df[COL_DATE].dt.weekday
 
-    df["productivite_ligne"] = (
-        df[STANDARDIZED_FACTURABLE] / df[STANDARDIZED_HEURES]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    df["productivite_ligne"] = safe_ratio(df[STANDARDIZED_FACTURABLE], df[STANDARDIZED_HEURES], positive_only=False)
 
     return df
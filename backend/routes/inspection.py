@@ -1,7 +1,6 @@
 """Routes pour l'inspection rate"""
 from fastapi import APIRouter, HTTPException, Request
-from datetime import date
-import pandas as pd
+from datetime import date, timedelta
 from services.inspection_service import calculate_inspection_analytics
 from utils.quarters import get_current_quarter_dates, get_quarter_dates
 from database import get_conn
@@ -38,13 +37,13 @@ async def get_inspection_analytics(request: Request, year: int | None = None, qu
     current_weekday = today.weekday()
     
     if current_weekday == 2:
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
 
     analytics = calculate_inspection_analytics(start_date, end_date, last_wednesday, team)
     
@@ -78,13 +77,13 @@ async def get_inspection_snapshot(request: Request):
     current_weekday = today.weekday()
     
     if current_weekday == 2:
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     
     analytics = calculate_inspection_analytics(start_date, end_date, last_wednesday)
     
@@ -2,20 +2,24 @@
 Productivity KPI API Routes
 REST endpoints for productivity and exhaustivity data
 """
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 from services.productivity_service import productivity_service
 
-router = APIRouter(prefix="/api/productivity", tags=["Productivity KPI"])
 
+async def ensure_productivity_loaded():
+    """Load the productivity data on first request, in a worker thread (Excel parse off the event loop)"""
+    if productivity_service._initialized:
+        return
+    await run_in_threadpool(productivity_service.initialize)
 
-@router.on_event("startup")
-async def startup_event():
-    """Initialize productivity service on startup"""
-    try:
-        productivity_service.initialize()
-    except Exception as e:
-        logger.error(f"Error during productivity service startup: {e}")
+
+router = APIRouter(
+    prefix="/api/productivity",
+    tags=["Productivity KPI"],
+    dependencies=[Depends(ensure_productivity_loaded)],
+)
 
 
 @router.get("/daily")
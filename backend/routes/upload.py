@@ -1,17 +1,84 @@
 """Routes pour l'upload de fichiers"""
+import re
 from io import BytesIO
 from pathlib import Path
 from fastapi import APIRouter, File, HTTPException, Request, UploadFile
 import pandas as pd
 from config import ADMIN_PASSWORD, ADMIN_EMAIL
-from database import get_conn, ensure_schema, POINTAGE_SCHEMA, INSPECTION_RECORD_SCHEMA
+from database import get_conn, ensure_schema, copy_upsert
+from kpi.productivity_loader import EXCEL_ENGINE
 from services.productivity_service_legacy import process_uploaded_file, set_latest_df
 from preprocessing.preprocessing_inspection import preprocess_uploaded_inspection_file
+from services.inspection_service import clear_analytics_cache
 from services.llti_service import process_uploaded_file as process_llti_file, set_latest_df as set_llti_df
 
 router = APIRouter(tags=["upload"])
 
 
+# Reconnaissance des colonnes d'inspection (premier motif qui correspond), compilée une fois
+_INSPECTION_COLUMN_PATTERNS = [
+    (re.compile(r"(?<![a-z])sn(?![a-z])|serial", re.I), "sn"),
+    (re.compile(r"^(?=.*date)(?=.*facture)", re.I), "date_facture"),
+    (re.compile(r"inspect", re.I), "is_inspected"),
+    (re.compile(r"^(?=.*(?<![a-z])or(?![a-z]))(?=.*segment)", re.I), "or_segment"),
+    (re.compile(r"^(?=.*type)(?=.*materiel)", re.I), "type_materiel"),
+    (re.compile(r"atelier", re.I), "atelier"),
+]
+# Colonne du numéro d'OR : le mot "or" (pas une sous-chaîne, ex. "normalisation") et "numéro"
+_OR_NUMBER_COLUMN = re.compile(r"^(?=.*(?<![a-z])or(?![a-z]))(?=.*num[eé]ro)", re.I)
+
+
+def _inspection_column_mapping(columns) -> dict[str, str]:
+    """Renommage des colonnes d'inspection vers les noms attendus (sn, date_facture, ...)"""
+    mapping = {}
+    for col in columns:
+        tag = next((tag for pattern, tag in _INSPECTION_COLUMN_PATTERNS if pattern.search(col)), None)
+        if tag:
+            mapping[col] = tag
+    return mapping
+
+
+def _inspection_rows(df: pd.DataFrame) -> list[tuple]:
+    """Tuples (sn, or_segment, type_materiel, atelier, date_facture, is_inspected) construits colonne par colonne"""
+    def texte(col: str) -> list[str]:
+        if col not in df.columns:
+            return [""] * len(df)
+        return [str(v or "") for v in df[col].tolist()]
+
+    return list(zip(
+        [str(v) for v in df["sn"].tolist()],
+        [v.strip() for v in texte("or_segment")],
+        texte("type_materiel"),
+        texte("atelier"),
+        df["date_facture"].dt.date.tolist(),
+        [str(v) for v in df["is_inspected"].tolist()],
+    ))
+
+
+def _techniciens_par_or(cur, or_segments) -> dict[str, tuple]:
+    """Technicien / équipe ayant le plus d'heures pointées sur chaque OR, en une seule requête
+
+    Même règle que l'ancienne recherche ligne à ligne : or_numero contenant le segment.
+    """
+    if not or_segments:
+        return {}
+    cur.execute(
+        """
+        SELECT seg, technicien, equipe
+        FROM (
+            SELECT s.seg, p.technicien, p.equipe,
+                   ROW_NUMBER() OVER (PARTITION BY s.seg ORDER BY SUM(p.heures_total) DESC) AS rn
+            FROM unnest(%s::text[]) AS s(seg)
+            JOIN pointage p ON p.or_numero LIKE '%%' || s.seg || '%%'
+            GROUP BY s.seg, p.technicien, p.equipe
+        ) t
+        WHERE rn = 1
+        """,
+        (list(or_segments),),
+    )
+    return {seg: (technicien, equipe) for seg, technicien, equipe in cur.fetchall()}
+
+
 @router.post("/kpi/productivite/upload")
 async def upload_kpi(request: Request, file: UploadFile = File(...)):
     """Upload des données de productivité"""
@@ -36,22 +103,21 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
     try:
         # Pour les fichiers Excel, vérifier s'il y a plusieurs onglets
         if suffix in {".xlsx", ".xls"}:
-            excel_file = pd.ExcelFile(buffer)
-            sheet_names = excel_file.sheet_names
+            # Tous les onglets en un seul appel (classeur ouvert une fois), chacun lu une seule fois
+            sheets = pd.read_excel(buffer, sheet_name=None, engine=EXCEL_ENGINE)
             
             df = None
             inspection_df = None
             
-            for sheet_name in sheet_names:
-                sheet_df = pd.read_excel(excel_file, sheet_name=sheet_name)
+            for sheet_df in sheets.values():
                 if {"Saisie heures - Date", "Salarié - Nom", "Facturable"}.issubset(set(sheet_df.columns)):
                     df = sheet_df
                 elif {"sn", "date_facture", "is_inspected"}.issubset(set(sheet_df.columns)) or \
                      {"SN", "Date Facture", "Is Inspected"}.issubset(set(sheet_df.columns)):
                     inspection_df = sheet_df
             
-            if df is None and sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_names[0])
+            if df is None and sheets:
+                df = next(iter(sheets.values()))
         else:
             df = pd.read_csv(buffer)
             inspection_df = None
@@ -62,11 +128,7 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
     df_prepared = process_uploaded_file(df)
 
     # Vérifier si la colonne "OR (Numéro)" existe
-    or_col = None
-    for col in df_prepared.columns:
-        if "or" in col.lower() and ("numéro" in col.lower() or "numero" in col.lower()):
-            or_col = col
-            break
+    or_col = next((col for col in df_prepared.columns if _OR_NUMBER_COLUMN.search(str(col))), None)
     
     # Agrégation par technicien / jour
     groupby_cols = ["Saisie heures - Date", "Salarié - Nom", "Salarié - Equipe(Nom)"]
@@ -81,122 +143,62 @@ async def upload_kpi(request: Request, file: UploadFile = File(...)):
         )
     )
 
-    rows = []
-    for _, r in grouped.iterrows():
-        rows.append((
-            r["Saisie heures - Date"].date(),
-            r["Salarié - Nom"],
-            r["Salarié - Equipe(Nom)"],
-            float(r["facturable"]),
-            float(r["heures_total"]),
-            str(r.get(or_col, "")) if or_col else None,
-        ))
-
+    # Tuples construits colonne par colonne (zip) plutôt qu'une Series par ligne (iterrows)
+    rows = list(zip(
+        grouped["Saisie heures - Date"].dt.date.tolist(),
+        grouped["Salarié - Nom"].tolist(),
+        grouped["Salarié - Equipe(Nom)"].tolist(),
+        grouped["facturable"].astype(float).tolist(),
+        grouped["heures_total"].astype(float).tolist(),
+        grouped[or_col].astype(str).tolist() if or_col else [None] * len(grouped),
+    ))
+
+    # Pointage et inspection dans une seule connexion / transaction (un seul commit)
     ensure_schema()
+    inspection_rows = 0
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(POINTAGE_SCHEMA)
-            cur.executemany(
-                """
-                INSERT INTO pointage (jour, technicien, equipe, facturable, heures_total, or_numero)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (technicien, jour)
-                DO UPDATE SET
-                    equipe = EXCLUDED.equipe,
-                    facturable = EXCLUDED.facturable,
-                    heures_total = EXCLUDED.heures_total,
-                    or_numero = EXCLUDED.or_numero,
-                    inserted_at = now();
-                """,
+            # Chargement en flux (COPY) dans une table temporaire, puis fusion en une seule requête
+            copy_upsert(
+                cur,
+                "pointage",
+                ["jour", "technicien", "equipe", "facturable", "heures_total", "or_numero"],
+                ["technicien", "jour"],
                 rows,
             )
+
+            # Traiter les données d'inspection si présentes
+            if inspection_df is not None:
+                try:
+                    # Point de sauvegarde : un échec de l'inspection n'annule pas le pointage
+                    with conn.transaction():
+                        inspection_df.columns = inspection_df.columns.str.strip()
+                        col_mapping = _inspection_column_mapping(inspection_df.columns)
+
+                        inspection_df = inspection_df.rename(columns=col_mapping)
+                        inspection_df_prepared = preprocess_uploaded_inspection_file(inspection_df)
+
+                        # Technicien avec le plus d'heures sur chaque OR : une requête pour tout le fichier
+                        inspection_rows_data = _inspection_rows(inspection_df_prepared)
+                        techniciens = _techniciens_par_or(cur, {r[1] for r in inspection_rows_data if r[1]})
+                        inspection_rows_data = [r + techniciens.get(r[1], (None, None)) for r in inspection_rows_data]
+
+                        if inspection_rows_data:
+                            copy_upsert(
+                                cur,
+                                "inspection_record",
+                                ["sn", "or_segment", "type_materiel", "atelier", "date_facture", "is_inspected", "technicien", "equipe"],
+                                ["sn", "date_facture"],
+                                inspection_rows_data,
+                            )
+                            inspection_rows = len(inspection_rows_data)
+                except Exception as exc:
+                    print(f"⚠️ Erreur traitement inspection: {exc}")
         conn.commit()
 
     set_latest_df(df_prepared)
-
-    # Traiter les données d'inspection si présentes
-    inspection_rows = 0
-    if inspection_df is not None:
-        try:
-            inspection_df.columns = inspection_df.columns.str.strip()
-            col_mapping = {}
-            for col in inspection_df.columns:
-                col_lower = col.lower()
-                if "sn" in col_lower or "serial" in col_lower:
-                    col_mapping[col] = "sn"
-                elif "date" in col_lower and "facture" in col_lower:
-                    col_mapping[col] = "date_facture"
-                elif "inspect" in col_lower:
-                    col_mapping[col] = "is_inspected"
-                elif "or" in col_lower and "segment" in col_lower:
-                    col_mapping[col] = "or_segment"
-                elif "type" in col_lower and "materiel" in col_lower:
-                    col_mapping[col] = "type_materiel"
-                elif "atelier" in col_lower:
-                    col_mapping[col] = "atelier"
-            
-            inspection_df = inspection_df.rename(columns=col_mapping)
-            inspection_df_prepared = preprocess_uploaded_inspection_file(inspection_df)
-            
-            inspection_rows_data = []
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    for _, row in inspection_df_prepared.iterrows():
-                        or_segment = str(row.get("or_segment", "") or "").strip()
-                        technicien = None
-                        equipe = None
-                        
-                        if or_segment:
-                            cur.execute(
-                                """
-                                SELECT technicien, equipe, SUM(heures_total) as total_heures
-                                FROM pointage
-                                WHERE or_numero = %s OR or_numero LIKE %s
-                                GROUP BY technicien, equipe
-                                ORDER BY total_heures DESC
-                                LIMIT 1
-                                """,
-                                (or_segment, f"%{or_segment}%"),
-                            )
-                            result = cur.fetchone()
-                            if result:
-                                technicien = result[0]
-                                equipe = result[1]
-                        
-                        inspection_rows_data.append((
-                            str(row["sn"]),
-                            or_segment,
-                            str(row.get("type_materiel", "") or ""),
-                            str(row.get("atelier", "") or ""),
-                            row["date_facture"].date(),
-                            str(row["is_inspected"]),
-                            technicien,
-                            equipe,
-                        ))
-            
-            if inspection_rows_data:
-                with get_conn() as conn:
-                    with conn.cursor() as cur:
-                        cur.executemany(
-                            """
-                            INSERT INTO inspection_record (sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT (sn, date_facture)
-                            DO UPDATE SET
-                                or_segment = EXCLUDED.or_segment,
-                                type_materiel = EXCLUDED.type_materiel,
-                                atelier = EXCLUDED.atelier,
-                                is_inspected = EXCLUDED.is_inspected,
-                                technicien = EXCLUDED.technicien,
-                                equipe = EXCLUDED.equipe,
-                                inserted_at = now();
-                            """,
-                            inspection_rows_data,
-                        )
-                    conn.commit()
-                inspection_rows = len(inspection_rows_data)
-        except Exception as exc:
-            print(f"⚠️ Erreur traitement inspection: {exc}")
+    if inspection_rows:
+        clear_analytics_cache()
 
     return {
         "message": "Données agrégées et sauvegardées en base (1 ligne par technicien/jour)",
@@ -235,7 +237,7 @@ async def upload_inspection(request: Request, file: UploadFile = File(...)):
     buffer = BytesIO(await file.read())
 
     try:
-        df = pd.read_excel(buffer) if suffix != ".csv" else pd.read_csv(buffer)
+        df = pd.read_excel(buffer, engine=EXCEL_ENGINE) if suffix != ".csv" else pd.read_csv(buffer)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
@@ -244,64 +246,24 @@ async def upload_inspection(request: Request, file: UploadFile = File(...)):
 
     # Pour chaque ligne, chercher le technicien avec le plus d'heures sur l'OR
     ensure_schema()
-    rows = []
-    
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for _, row in df_prepared.iterrows():
-                or_segment = str(row.get("or_segment", "") or "").strip()
-                technicien = None
-                equipe = None
-                
-                if or_segment:
-                    cur.execute(
-                        """
-                        SELECT technicien, equipe, SUM(heures_total) as total_heures
-                        FROM pointage
-                        WHERE or_numero = %s OR or_numero LIKE %s
-                        GROUP BY technicien, equipe
-                        ORDER BY total_heures DESC
-                        LIMIT 1
-                        """,
-                        (or_segment, f"%{or_segment}%"),
-                    )
-                    result = cur.fetchone()
-                    if result:
-                        technicien = result[0]
-                        equipe = result[1]
-                
-                rows.append((
-                    str(row["sn"]),
-                    or_segment,
-                    str(row.get("type_materiel", "") or ""),
-                    str(row.get("atelier", "") or ""),
-                    row["date_facture"].date(),
-                    str(row["is_inspected"]),
-                    technicien,
-                    equipe,
-                ))
+    rows = _inspection_rows(df_prepared)
 
-    # Insérer en base
+    # Technicien avec le plus d'heures sur chaque OR (une requête), puis insertion, sur la même connexion
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(
-                """
-                INSERT INTO inspection_record (sn, or_segment, type_materiel, atelier, date_facture, is_inspected, technicien, equipe)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (sn, date_facture)
-                DO UPDATE SET
-                    or_segment = EXCLUDED.or_segment,
-                    type_materiel = EXCLUDED.type_materiel,
-                    atelier = EXCLUDED.atelier,
-                    is_inspected = EXCLUDED.is_inspected,
-                    technicien = EXCLUDED.technicien,
-                    equipe = EXCLUDED.equipe,
-                    inserted_at = now();
-                """,
+            techniciens = _techniciens_par_or(cur, {r[1] for r in rows if r[1]})
+            rows = [r + techniciens.get(r[1], (None, None)) for r in rows]
+            copy_upsert(
+                cur,
+                "inspection_record",
+                ["sn", "or_segment", "type_materiel", "atelier", "date_facture", "is_inspected", "technicien", "equipe"],
+                ["sn", "date_facture"],
                 rows,
             )
         conn.commit()
 
+    clear_analytics_cache()
+
     return {"message": "Données d'inspection enregistrées", "rows": len(rows)}
 
 
@@ -327,7 +289,7 @@ async def upload_llti(request: Request, file: UploadFile = File(...)):
     buffer = BytesIO(await file.read())
 
     try:
-        df = pd.read_excel(buffer) if suffix != ".csv" else pd.read_csv(buffer)
+        df = pd.read_excel(buffer, engine=EXCEL_ENGINE) if suffix != ".csv" else pd.read_csv(buffer)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
@@ -342,41 +304,40 @@ async def upload_llti(request: Request, file: UploadFile = File(...)):
 
     # Insérer en base
     ensure_schema()
-    rows = []
-    
-    for _, row in df_prepared.iterrows():
-        rows.append((
-            str(row.get("N° OR (Segment)", "") or ""),
-            str(row.get("N° Facture (Lignes)", "") or ""),
-            row["Date Facture (Lignes)"].date() if pd.notna(row["Date Facture (Lignes)"]) else None,
-            row["Pointage dernière date (Segment)"].date() if pd.notna(row["Pointage dernière date (Segment)"]) else None,
-            str(row.get("Nom Client OR (or)", "") or ""),
-            str(row.get("Numéro série Equipement (Segment)", "") or ""),
-            str(row.get("Constructeur de l'équipement", "") or ""),
-            float(row.get("LLTI_jours", 0) or 0),
-        ))
+
+    def texte(col: str) -> list[str]:
+        if col not in df_prepared.columns:
+            return [""] * len(df_prepared)
+        return [str(v or "") for v in df_prepared[col].tolist()]
+
+    def jours(col: str) -> list:
+        dates = df_prepared[col]
+        return dates.dt.date.astype(object).where(dates.notna(), None).tolist()
+
+    # Tuples construits colonne par colonne plutôt qu'une Series par ligne (iterrows)
+    llti = df_prepared["LLTI_jours"].tolist() if "LLTI_jours" in df_prepared.columns else [0] * len(df_prepared)
+    rows = list(zip(
+        texte("N° OR (Segment)"),
+        texte("N° Facture (Lignes)"),
+        jours("Date Facture (Lignes)"),
+        jours("Pointage dernière date (Segment)"),
+        texte("Nom Client OR (or)"),
+        texte("Numéro série Equipement (Segment)"),
+        texte("Constructeur de l'équipement"),
+        [float(v or 0) for v in llti],
+    ))
 
     # Filtrer les lignes valides
     rows = [r for r in rows if r[2] and r[3] and r[1]]  # date_facture, date_pointage, numero_facture
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(
-                """
-                INSERT INTO llti_record (or_segment, numero_facture, date_facture, date_pointage,
-                                       client, sn_equipement, constructeur, llti_jours)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (numero_facture)
-                DO UPDATE SET
-                    or_segment = EXCLUDED.or_segment,
-                    date_facture = EXCLUDED.date_facture,
-                    date_pointage = EXCLUDED.date_pointage,
-                    client = EXCLUDED.client,
-                    sn_equipement = EXCLUDED.sn_equipement,
-                    constructeur = EXCLUDED.constructeur,
-                    llti_jours = EXCLUDED.llti_jours,
-                    inserted_at = now();
-                """,
+            copy_upsert(
+                cur,
+                "llti_record",
+                ["or_segment", "numero_facture", "date_facture", "date_pointage",
+                 "client", "sn_equipement", "constructeur", "llti_jours"],
+                ["numero_facture"],
                 rows,
             )
         conn.commit()
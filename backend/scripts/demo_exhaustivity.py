@@ -0,0 +1,51 @@
+"""
+Exhaustivity controller demo
+
+Usage (from backend/): python -m scripts.demo_exhaustivity
+"""
+from kpi.productivity_loader import ProductivityDataLoader
+from kpi.productivity_calculator import ProductivityCalculator
+from kpi.exhaustivity_controller import ExhaustivityController
+
+
+def main():
+    # Load and calculate
+    loader = ProductivityDataLoader()
+    df_raw, summary = loader.load_and_prepare()
+
+    calc = ProductivityCalculator(df_raw)
+    df_daily = calc.calculate_productivity_daily()
+
+    # Exhaustivity control
+    controller = ExhaustivityController(df_daily)
+
+    # Check exhaustivity
+    df_exh = controller.check_exhaustivity_daily()
+    print("\n=== EXHAUSTIVITY STATUS (Sample) ===")
+    print(df_exh.head(10))
+    print(f"\nStatus distribution:")
+    print(df_exh['statut_exhaustivite'].value_counts())
+
+    # Calculate rates
+    print("\n=== GLOBAL EXHAUSTIVITY RATE ===")
+    rate_global = controller.calculate_exhaustivity_rate(df_exh, by='global')
+    print(rate_global)
+
+    print("\n=== EXHAUSTIVITY RATE BY TEAM ===")
+    rate_team = controller.calculate_exhaustivity_rate(df_exh, by='team')
+    print(rate_team.sort_values('taux_exhaustivite_pct', ascending=False))
+
+    # Detect anomalies
+    print("\n=== CRITICAL ANOMALIES (ROUGE) ===")
+    anomalies_rouge = controller.detect_anomalies(df_exh, anomaly_types=['ROUGE'])
+    print(f"Total: {len(anomalies_rouge)} missing days")
+    print(anomalies_rouge.head(10))
+
+    print("\n=== INCOMPLETE DAYS (ORANGE) ===")
+    anomalies_orange = controller.detect_anomalies(df_exh, anomaly_types=['ORANGE'])
+    print(f"Total: {len(anomalies_orange)} incomplete days")
+    print(anomalies_orange.head(10))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 """Service pour la gestion de l'inspection rate"""
+import threading
+import time
+from collections import OrderedDict
 from datetime import date
 from typing import Any, Dict
 import pandas as pd
@@ -10,6 +13,16 @@ from preprocessing.preprocessing_inspection import (
 from kpi.kpi_inspection import calculate_full_inspection_analytics
 
 
+# Cache mémoire des analytics (stale-while-revalidate, LRU borné ; seuls les chargements réussis sont stockés)
+ANALYTICS_CACHE_TTL = 60  # secondes
+CLOSED_PERIOD_CACHE_TTL = 3600  # secondes, périodes terminées (ne changent qu'à l'upload, qui vide le cache)
+ANALYTICS_CACHE_MAXSIZE = 32  # la clé contient l'équipe (texte libre) et le mercredi dernier
+_analytics_cache: "OrderedDict[tuple, tuple[float, Dict[str, Any]]]" = OrderedDict()
+_analytics_refreshing: set[tuple] = set()
+_analytics_generation = 0
+_analytics_lock = threading.Lock()
+
+
 def load_inspection_from_db(start_date: date | None = None, end_date: date | None = None, team: str | None = None) -> pd.DataFrame | None:
     """Charge et preprocess les données d'inspection depuis la base de données"""
     df_raw = load_raw_inspection_data(start_date, end_date, team)
@@ -23,35 +36,122 @@ def process_uploaded_file(df: pd.DataFrame) -> pd.DataFrame:
     return preprocess_uploaded_inspection_file(df)
 
 
+def clear_analytics_cache():
+    """Invalide le cache des analytics (à appeler après un upload d'inspection)"""
+    global _analytics_generation
+    with _analytics_lock:
+        _analytics_generation += 1
+        _analytics_cache.clear()
+
+
+def _empty_analytics() -> Dict[str, Any]:
+    """Analytics d'une période sans données"""
+    return {
+        "total": 0,
+        "inspected": 0,
+        "not_inspected": 0,
+        "inspection_rate": 0.0,
+        "delta_weekly": 0.0,
+        "inspection_rate_last_wednesday": 0.0,
+        "by_atelier": [],
+        "by_type_materiel": [],
+        "by_technicien": [],
+        "records": [],
+    }
+
+
+def _compute_and_store(key: tuple) -> Dict[str, Any]:
+    """Calcule les analytics pour `key` et les met en cache"""
+    with _analytics_lock:
+        generation = _analytics_generation
+    try:
+        try:
+            df_raw, df_raw_last = _load_inspection_period(*key)
+        except Exception as exc:
+            # Erreur de base : réponse vide pour cet appel seulement, rien n'est mis en cache
+            # (une éventuelle valeur déjà en cache reste servie)
+            print(f"⚠️ Erreur chargement données inspection: {exc}")
+            return _empty_analytics()
+        # Les erreurs de calcul (bug KPI) ne sont pas masquées : elles remontent à l'appelant
+        analytics = _compute_inspection_analytics(df_raw, df_raw_last)
+        with _analytics_lock:
+            # Ne pas réécrire un résultat calculé avant une invalidation
+            if generation == _analytics_generation:
+                _analytics_cache[key] = (time.monotonic(), analytics)
+                _analytics_cache.move_to_end(key)
+                while len(_analytics_cache) > ANALYTICS_CACHE_MAXSIZE:
+                    _analytics_cache.popitem(last=False)
+        return analytics
+    finally:
+        with _analytics_lock:
+            _analytics_refreshing.discard(key)
+
+
+def _schedule_refresh(key: tuple):
+    """Relance le calcul en arrière-plan si aucun rafraîchissement n'est en cours"""
+    with _analytics_lock:
+        if key in _analytics_refreshing:
+            return
+        _analytics_refreshing.add(key)
+    threading.Thread(target=_compute_and_store, args=(key,), daemon=True).start()
+
+
 def calculate_inspection_analytics(start_date: date, end_date: date, last_wednesday: date | None = None, team: str | None = None) -> Dict[str, Any]:
     """Fonction utilitaire pour calculer les analytics d'inspection (utilisée par tous les composants)
     
+    Les résultats sont mis en cache par (période, mercredi dernier, équipe) pendant
+    ANALYTICS_CACHE_TTL secondes (CLOSED_PERIOD_CACHE_TTL pour une période terminée
+    et non vide, ex. les trimestres passés de l'historique) ; passé ce délai, la valeur
+    en cache est servie pendant qu'un recalcul est lancé en arrière-plan. Un échec de
+    chargement n'est jamais mis en cache.
+    
     Logique de calcul :
     - Taux d'inspection = (Nombre d'OR uniques avec Is Inspected = "Inspecté") / (Nombre Total d'OR uniques facturés) * 100
     - C'est un KPI trimestriel basé sur les OR, pas sur les lignes individuelles
     """
-    # Charger et preprocess les données depuis la base
-    df = load_inspection_from_db(start_date, end_date, team)
+    key = (start_date, end_date, last_wednesday, team)
+    with _analytics_lock:
+        cached = _analytics_cache.get(key)
+        if cached is not None:
+            _analytics_cache.move_to_end(key)
+    if cached is None:
+        return _compute_and_store(key)
+
+    computed_at, analytics = cached
+    # TTL long seulement pour une période terminée avec des données : un résultat vide
+    # garde le TTL court (seuls les chargements réussis sont en cache, cf. _compute_and_store)
+    closed = end_date < date.today() and analytics["total"] > 0
+    ttl = CLOSED_PERIOD_CACHE_TTL if closed else ANALYTICS_CACHE_TTL
+    if time.monotonic() - computed_at >= ttl:
+        _schedule_refresh(key)
+    return analytics
+
+
+def _load_inspection_period(start_date: date, end_date: date, last_wednesday: date | None = None,
+                            team: str | None = None) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
+    """Lit les données brutes de la période (et jusqu'au mercredi dernier si demandé)
+    
+    Les erreurs de base sont propagées : un échec de chargement ne doit pas être
+    confondu avec une période sans données.
+    """
+    df_raw = load_raw_inspection_data(start_date, end_date, team, raise_errors=True)
+    df_raw_last = None
+    if df_raw is not None and last_wednesday:
+        df_raw_last = load_raw_inspection_data(start_date, last_wednesday, team, raise_errors=True)
+    return df_raw, df_raw_last
+
+
+def _compute_inspection_analytics(df_raw: pd.DataFrame | None, df_raw_last: pd.DataFrame | None) -> Dict[str, Any]:
+    """Calcule les analytics d'inspection à partir des données brutes (sans cache)"""
+    if df_raw is None:
+        return _empty_analytics()
     
-    if df is None or df.empty:
-        return {
-            "total": 0,
-            "inspected": 0,
-            "not_inspected": 0,
-            "inspection_rate": 0.0,
-            "delta_weekly": 0.0,
-            "inspection_rate_last_wednesday": 0.0,
-            "by_atelier": [],
-            "by_type_materiel": [],
-            "by_technicien": [],
-            "records": [],
-        }
+    df = preprocess_inspection_df(df_raw)
+    if df.empty:
+        return _empty_analytics()
     
-    # Charger les données du mercredi dernier si nécessaire
-    df_last = None
-    if last_wednesday:
-        df_last = load_inspection_from_db(start_date, last_wednesday, team)
+    # Données du mercredi dernier si demandées
+    df_last = preprocess_inspection_df(df_raw_last) if df_raw_last is not None else None
     
     # Utiliser le module kpi pour calculer tous les analytics
     return calculate_full_inspection_analytics(df, df_last)
-
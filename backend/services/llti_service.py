@@ -6,7 +6,7 @@ from preprocessing.preprocessing_llti import (
     preprocess_uploaded_llti_file,
     preprocess_llti,
 )
-from database import get_conn
+from database import read_sql_copy
 from kpi.kpi_llti import calculate_all_llti_analytics
 
 
@@ -16,16 +16,15 @@ LATEST_LLTI_DF: pd.DataFrame | None = None
 def load_raw_llti_data() -> pd.DataFrame | None:
     """Charge les données brutes LLTI depuis la base de données"""
     try:
-        with get_conn() as conn:
-            df_db = pd.read_sql_query(
-                """
-                SELECT or_segment, numero_facture, date_facture, date_pointage,
-                       client, sn_equipement, constructeur, llti_jours
-                FROM llti_record
-                ORDER BY date_facture DESC
-                """,
-                conn,
-            )
+        df_db = read_sql_copy(
+            """
+            SELECT or_segment, numero_facture, date_facture, date_pointage,
+                   client, sn_equipement, constructeur, llti_jours
+            FROM llti_record
+            ORDER BY date_facture DESC
+            """,
+            text_columns=["or_segment", "numero_facture", "client", "sn_equipement", "constructeur"],
+        )
         if df_db.empty:
             return None
         
@@ -1,7 +1,6 @@
 """Service pour la génération de comptes rendus de réunion en Markdown"""
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Any, Dict, List
-import pandas as pd
 from services.productivity_service_legacy import load_from_db, get_latest_df
 from services.inspection_service import calculate_inspection_analytics
 from utils.quarters import get_current_quarter_dates
@@ -36,13 +35,13 @@ def generate_meeting_summary(meeting_date: date | None = None) -> Dict[str, Any]
     current_weekday = today.weekday()
     
     if current_weekday == 2:
-        last_wednesday = today - pd.Timedelta(days=7)
+        last_wednesday = today - timedelta(days=7)
     elif current_weekday > 2:
         days_back = current_weekday - 2
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     else:
         days_back = 7 - (2 - current_weekday)
-        last_wednesday = today - pd.Timedelta(days=days_back)
+        last_wednesday = today - timedelta(days=days_back)
     
     inspection_analytics = calculate_inspection_analytics(start_date, end_date, last_wednesday)
     
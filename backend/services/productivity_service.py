@@ -6,6 +6,7 @@ from typing import Dict, List, Optional
 import pandas as pd
 from datetime import datetime
 import logging
+import threading
 
 from kpi.productivity_loader import ProductivityDataLoader
 from kpi.productivity_calculator import ProductivityCalculator
@@ -26,12 +27,18 @@ class ProductivityService:
         self.calculator = None
         self.controller = None
         self._initialized = False
+        self._init_lock = threading.Lock()
     
     def initialize(self):
-        """Load and prepare data (call once at startup)"""
+        """Load and prepare data (runs once; thread-safe, called from a worker thread by the routes)"""
         if self._initialized:
             return
-        
+        with self._init_lock:
+            if not self._initialized:
+                self._initialize()
+    
+    def _initialize(self):
+        """Load the workbook, daily productivity and exhaustivity controller"""
         logger.info("Initializing Productivity Service...")
         
         try:
@@ -45,6 +52,7 @@ class ProductivityService:
             # Initialize exhaustivity controller
             self.controller = ExhaustivityController(self.df_daily)
             
+            # Weekly/monthly/rolling/team aggregations are computed lazily (memoized by the calculator)
             self._initialized = True
             logger.info("Productivity Service initialized successfully")
         except FileNotFoundError as e:
@@ -115,11 +123,11 @@ class ProductivityService:
         if month and 'mois' in df.columns:
             df = df[df['mois'] == month]
         
-        # Convert dates if present
+        # Convert dates if present (assign: the calculator's result is memoized)
         if 'date' in df.columns:
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+            df = df.assign(date=df['date'].dt.strftime('%Y-%m-%d'))
         if 'semaine_debut' in df.columns:
-            df['semaine_debut'] = df['semaine_debut'].dt.strftime('%Y-%m-%d')
+            df = df.assign(semaine_debut=df['semaine_debut'].dt.strftime('%Y-%m-%d'))
         
         return df.to_dict('records')
     
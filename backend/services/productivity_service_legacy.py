@@ -6,6 +6,7 @@ This is a stub service that provides the old interface
 import pandas as pd
 from typing import Optional
 import logging
+from kpi.productivity_loader import EXCEL_ENGINE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,7 +45,7 @@ def process_uploaded_file(file_path: str) -> pd.DataFrame:
     logger.info(f"Processing uploaded file: {file_path}")
     
     # Load Excel
-    df = pd.read_excel(file_path)
+    df = pd.read_excel(file_path, engine=EXCEL_ENGINE)
     
     # Basic cleaning
     df['Saisie heures - Date'] = pd.to_datetime(df['Saisie heures - Date'])
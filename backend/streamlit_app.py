@@ -11,6 +11,7 @@ sys.path.insert(0, current_dir)
 
 # Imports et configuration
 import psycopg
+from utils.ratios import safe_ratio
 
 # Constantes
 STANDARDIZED_HEURES = "Heures_travaillées"
@@ -285,9 +286,7 @@ def render_productivity_detail():
         )
         .reset_index()
     )
-    tech_agg["productivite"] = (
-        tech_agg["facturable"] / tech_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    tech_agg["productivite"] = safe_ratio(tech_agg["facturable"], tech_agg["heures"], positive_only=False)
     tech_agg = tech_agg.sort_values("productivite", ascending=False)
     st.dataframe(tech_agg, use_container_width=True)
     
@@ -300,9 +299,7 @@ def render_productivity_detail():
         )
         .reset_index()
     )
-    team_agg["productivite"] = (
-        team_agg["facturable"] / team_agg["heures"]
-    ).replace([float("inf"), -float("inf")], 0).fillna(0)
+    team_agg["productivite"] = safe_ratio(team_agg["facturable"], team_agg["heures"], positive_only=False)
     st.dataframe(team_agg, use_container_width=True)
 
 
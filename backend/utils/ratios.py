@@ -0,0 +1,22 @@
+"""Division masquée pour les ratios (productivité, etc.)"""
+import numpy as np
+
+
+def safe_ratio(num, den, *, positive_only: bool) -> np.ndarray:
+    """num / den élément par élément, 0 là où le dénominateur est exclu
+
+    La division n'est faite que sur les lignes retenues (np.divide(where=...)) : ni inf ni NaN à nettoyer.
+
+    Args:
+        num: Numérateurs (Series ou tableau)
+        den: Dénominateurs (Series ou tableau)
+        positive_only: True pour ne diviser que là où den > 0, False là où den != 0
+
+    Returns:
+        Tableau float64 des ratios
+    """
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    out = np.zeros(len(den))
+    np.divide(num, den, out=out, where=den > 0 if positive_only else den != 0)
+    return out